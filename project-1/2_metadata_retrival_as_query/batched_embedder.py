@@ -0,0 +1,78 @@
+"""
+Dynamic batcher for query embeddings
+Coalesces concurrent embed requests into one OpenAI call
+"""
+
+import asyncio
+from typing import List
+import logging
+
+logger = logging.getLogger(__name__)
+
+# Upper bound on queries coalesced into one embed_documents call
+MAX_BATCH = 64
+
+# How long the worker waits for more queries to join a batch (seconds).
+# Small enough to be invisible per request, large enough that concurrent
+# requests land in the same OpenAI call.
+MAX_WAIT = 0.01
+
+
+class BatchedEmbedder:
+    """Coalesce concurrent embed_query calls into embed_documents batches
+
+    Each awaiting caller pays one ~10 ms coalescing window at most; in
+    return, N concurrent queries share a single OpenAI HTTP round-trip
+    (one TLS exchange, one tokenization pass) instead of issuing N.
+    """
+
+    def __init__(self, embeddings, max_batch: int = MAX_BATCH,
+                 max_wait: float = MAX_WAIT):
+        self.embeddings = embeddings
+        self.max_batch = max_batch
+        self.max_wait = max_wait
+        # Queue and worker are created lazily inside a running event loop
+        self._queue = None
+        self._worker = None
+
+    async def embed(self, text: str) -> List[float]:
+        """Embed one text, sharing the API call with concurrent callers"""
+        if self._queue is None:
+            self._queue = asyncio.Queue()
+            self._worker = asyncio.create_task(self._run())
+
+        future = asyncio.get_running_loop().create_future()
+        await self._queue.put((text, future))
+        return await future
+
+    async def _run(self):
+        """Worker: drain up to max_batch items per window, one API call each"""
+        loop = asyncio.get_running_loop()
+        while True:
+            batch = [await self._queue.get()]
+            deadline = loop.time() + self.max_wait
+            while len(batch) < self.max_batch:
+                timeout = deadline - loop.time()
+                if timeout <= 0:
+                    break
+                try:
+                    batch.append(
+                        await asyncio.wait_for(self._queue.get(), timeout))
+                except asyncio.TimeoutError:
+                    break
+
+            if len(batch) > 1:
+                logger.debug("Embedding %d coalesced queries in one call", len(batch))
+
+            try:
+                vectors = await self.embeddings.aembed_documents(
+                    [text for text, _ in batch])
+            except Exception as e:
+                for _, future in batch:
+                    if not future.done():
+                        future.set_exception(e)
+                continue
+
+            for (_, future), vector in zip(batch, vectors):
+                if not future.done():
+                    future.set_result(vector)
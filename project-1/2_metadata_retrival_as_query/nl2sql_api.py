@@ -5,22 +5,104 @@ Natural Language to SQL query generation using S3 Vectors and OpenAI
 
 from fastapi import FastAPI, HTTPException
 from fastapi.middleware.cors import CORSMiddleware
-from pydantic import BaseModel
+from fastapi.responses import JSONResponse, ORJSONResponse, StreamingResponse
+from pydantic import BaseModel, ConfigDict, Field
 from typing import Dict, List, Optional
+import asyncio
+import hashlib
+import json
 import logging
+import re
+from contextlib import asynccontextmanager
 
+from cachetools import TTLCache
+
+import numpy as np
+import tiktoken
 from langchain_openai import ChatOpenAI
 from s3_vector_retriever import S3VectorRetriever
 
+
+try:
+    import orjson  # Rust-backed, 2-3x faster than stdlib on small payloads
+except ImportError:
+    orjson = None
+
+
+def _json_loads(text: str):
+    """Parse JSON with orjson when available, stdlib json otherwise
+
+    orjson.JSONDecodeError subclasses json.JSONDecodeError, so callers can
+    catch the stdlib type either way.
+    """
+    return orjson.loads(text) if orjson is not None else json.loads(text)
+
+
+def _validate_stream_payload(chunks: List[str]):
+    """Parse the accumulated stream once, after the final chunk
+
+    The tempting pattern - join + parse after every delta - is O(n^2) in
+    response length and holds the event loop during each parse. Deltas are
+    therefore accumulated in a list and decoded exactly once at
+    end-of-stream. Invalid payloads are logged, not raised: the tokens
+    have already been sent to the client.
+    """
+    payload = "".join(chunks).strip()
+    # Strip a markdown fence once, at the end, rather than per chunk
+    if payload.startswith('```'):
+        payload = payload.strip('`').removeprefix('json').strip()
+    if not payload or payload[-1] not in ('}', ']'):
+        logger.warning("Streamed response does not look like complete JSON")
+        return
+    try:
+        _json_loads(payload)
+    except json.JSONDecodeError as e:
+        logger.warning(f"Streamed response was not valid JSON: {e}")
+
 # Configure logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+# Global retriever, built once at startup by the lifespan handler
+retriever = None
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """Build and warm the retriever before the first request
+
+    Lazy init meant the first request after boot paid boto3 client setup,
+    the OpenAI embeddings handshake, and cold connections - 1-2 seconds
+    that also trips liveness probes. Construct everything at startup and
+    fire one warm-up embed + search so real requests only ever hit warm
+    paths.
+    """
+    global retriever
+    retriever = await asyncio.to_thread(
+        S3VectorRetriever,
+        semantic_bucket=SEMANTIC_BUCKET,
+        procedural_bucket=PROCEDURAL_BUCKET,
+        aws_region=AWS_REGION
+    )
+    try:
+        embedding = await asyncio.to_thread(retriever._embed, "warmup")
+        await retriever.search_by_embedding_async(
+            embedding, semantic_k=1, procedural_k=1)
+        logger.info("Warm-up query completed")
+    except Exception as e:
+        logger.warning(f"Warm-up query failed: {e}")
+    yield
+
+
 # Initialize FastAPI app
 app = FastAPI(
     title="NL2SQL API",
     description="Natural Language to SQL Query Generation API",
-    version="1.0.0"
+    version="1.0.0",
+    lifespan=lifespan,
+    # Serialize responses with orjson when installed - a pure CPU win on
+    # the large context_used blobs - falling back to stdlib json
+    default_response_class=ORJSONResponse if orjson is not None else JSONResponse
 )
 
 # Add CORS middleware
@@ -37,9 +119,6 @@ SEMANTIC_BUCKET = 'nl2sql-semantic-memory'
 PROCEDURAL_BUCKET = 'nl2sql-procedural-memory'
 AWS_REGION = 'us-east-1'
 
-# Initialize retriever (lazy loading)
-retriever = None
-
 # Initialize OpenAI
 llm = ChatOpenAI(
     model="gpt-4o",
@@ -48,6 +127,19 @@ llm = ChatOpenAI(
 )
 
 
+
+# Client-side response cache: at temperature=0 the pipeline output is
+# deterministic for a given question, so repeats skip the entire
+# embed -> search -> LLM pipeline and return in microseconds
+_response_cache = TTLCache(maxsize=1024, ttl=3600)
+
+
+def _response_cache_key(request: "QueryRequest") -> str:
+    """Normalized cache key - case and surrounding whitespace don't change the answer"""
+    raw = f"{request.question.strip().lower()}\x00{request.database}"
+    return hashlib.blake2b(raw.encode()).hexdigest()
+
+
 class QueryRequest(BaseModel):
     """Request model for NL2SQL query"""
     question: str
@@ -65,18 +157,131 @@ class QueryResponse(BaseModel):
     context_used: Optional[Dict] = None  # Add context details
 
 
+class SQLGeneration(BaseModel):
+    """LLM output schema, enforced server-side via structured outputs"""
+    sql_query: str
+    explanation: str
+    relevant_tables: List[str]
+    confidence: str
+
+
+# Structured-output variant: OpenAI constrains generation to the
+# SQLGeneration schema, so the output is guaranteed parseable - no
+# fence-stripping, no JSONDecodeError branch on the happy path
+structured_llm = llm.with_structured_output(SQLGeneration)
+
+
 def get_retriever():
-    """Lazy load retriever"""
-    global retriever
-    if retriever is None:
-        retriever = S3VectorRetriever(
-            semantic_bucket=SEMANTIC_BUCKET,
-            procedural_bucket=PROCEDURAL_BUCKET,
-            aws_region=AWS_REGION
-        )
+    """Return the retriever built at startup by the lifespan handler"""
     return retriever
 
 
+# Compiled once at import: each marker is located in a single scan of the
+# text instead of separate find/split passes over the same multi-KB string
+# per field
+_JOIN_CONDITION_RE = re.compile(r'JOIN_CONDITION:([^\n]*)\n')
+_DESCRIPTION_RE = re.compile(r'DESCRIPTION:(.*?)\n\n', re.DOTALL)
+_EXAMPLES_RE = re.compile(r'EXAMPLES:(.*)', re.DOTALL)
+_EXAMPLE_LINE_RE = re.compile(r'^\s*-[-\s]*([^\n]*)$', re.MULTILINE)
+
+
+def _truncate(text: str, limit: int) -> str:
+    """Ellipsized preview used throughout the context details"""
+    return text[:limit] + '...' if len(text) > limit else text
+
+
+def _extract_column(details: Dict, table_name: str, column_name: str,
+                    text: str, relevance: float):
+    """Record a column vector in the context details"""
+    if not column_name:
+        return
+    details['columns'].append({
+        'table': table_name,
+        'column': column_name,
+        'description': _truncate(text, 200),
+        'full_text': text,
+        'relevance_score': relevance
+    })
+    table = details['tables'][table_name]
+    if column_name not in table['columns']:
+        table['columns'].append(column_name)
+
+
+def _extract_relationship(details: Dict, table_name: str, column_name: str,
+                          text: str, relevance: float):
+    """Record a relationship vector in the context details"""
+    match = _JOIN_CONDITION_RE.search(text)
+    join_condition = match.group(1).strip() if match else ''
+
+    details['relationships'].append({
+        'description': _truncate(text, 300),
+        'join_condition': join_condition,
+        'full_text': text,
+        'relevance_score': relevance
+    })
+
+    table = details['tables'][table_name]
+    if text not in table['relationships']:
+        table['relationships'].append(text[:150])
+
+
+def _extract_table(details: Dict, table_name: str, column_name: str,
+                   text: str, relevance: float):
+    """Record a table-description vector in the context details"""
+    table = details['tables'][table_name]
+    if not table['description']:
+        table['description'] = _truncate(text, 200)
+
+
+# Dispatch table replaces the per-vector if/elif ladder on entity_type
+_SEMANTIC_HANDLERS = {
+    'column': _extract_column,
+    'relationship': _extract_relationship,
+    'table': _extract_table,
+}
+
+
+
+class MatchMetadata(BaseModel):
+    """Vector metadata validated once per match
+
+    Hot loops then use attribute access on a C-accelerated pydantic v2
+    model instead of repeated dict.get calls with default materialization;
+    unknown metadata keys are preserved via extra='allow'.
+    """
+    model_config = ConfigDict(extra='allow')
+
+    text: str = ''
+    preview: str = ''
+    table_name: str = 'unknown'
+    entity_type: str = 'unknown'
+    column_name: str = ''
+
+
+class Match(BaseModel):
+    """A retrieved vector match in normalized form"""
+    model_config = ConfigDict(extra='allow')
+
+    key: Optional[str] = None
+    distance: float = 0.0
+    metadata: MatchMetadata = Field(default_factory=MatchMetadata)
+
+
+# Below this many vectors the NumPy call overhead exceeds the loop cost
+_VECTORIZE_MIN = 8
+
+
+def _relevance_scores(matches: List[Match]) -> List[float]:
+    """Per-match relevance (1 - distance), vectorized for larger batches"""
+    if len(matches) >= _VECTORIZE_MIN:
+        # float64 keeps .tolist() emitting clean 3-decimal values; float32
+        # leaks representation artifacts (0.8539999...) into API responses
+        dists = np.fromiter((m.distance for m in matches),
+                            dtype=np.float64, count=len(matches))
+        return np.round(1.0 - dists, 3).tolist()
+    return [round(1 - m.distance, 3) for m in matches]
+
+
 def extract_context_details(semantic_results: List[Dict], procedural_results: List[Dict]) -> Dict:
     """Extract detailed context information from retrieved vectors"""
 
@@ -87,137 +292,137 @@ def extract_context_details(semantic_results: List[Dict], procedural_results: Li
         "example_queries": []
     }
 
-    # Process semantic results
-    for vec in semantic_results:
-        metadata = vec.get('metadata', {})
-        # Text is stored in metadata since S3 Vectors only returns metadata
-        text = metadata.get('text', '')
-        distance = vec.get('distance', 0)
+    # Bind hot lookups once instead of per vector
+    tables = details['tables']
+    get_handler = _SEMANTIC_HANDLERS.get
 
-        table_name = metadata.get('table_name', 'unknown')
-        entity_type = metadata.get('entity_type', 'unknown')
-        column_name = metadata.get('column_name', '')
+    # Validate each match once; the loop body then uses plain attribute
+    # access instead of chained dict.get calls
+    semantic_matches = [Match.model_validate(v, from_attributes=True)
+                        for v in semantic_results]
+
+    # Process semantic results
+    for match, relevance in zip(semantic_matches, _relevance_scores(semantic_matches)):
+        metadata = match.metadata
+        # Hydrated from the texts.sqlite side store by the retriever; the
+        # preview is the last resort if the side store lacks the row
+        text = metadata.text or metadata.preview
+        table_name = metadata.table_name
+        entity_type = metadata.entity_type
+        column_name = metadata.column_name
 
         # Initialize table if not exists
-        if table_name not in details['tables']:
-            details['tables'][table_name] = {
+        if table_name not in tables:
+            tables[table_name] = {
                 'columns': [],
                 'relationships': [],
                 'description': ''
             }
 
-        # Extract columns
-        if entity_type == 'column' and column_name:
-            details['columns'].append({
-                'table': table_name,
-                'column': column_name,
-                'description': text[:200] + '...' if len(text) > 200 else text,
-                'full_text': text,
-                'relevance_score': round(1 - distance, 3)
-            })
-            if column_name not in details['tables'][table_name]['columns']:
-                details['tables'][table_name]['columns'].append(column_name)
-
-        # Extract relationships
-        elif entity_type == 'relationship':
-            # Extract key information from text
-            join_condition = ''
-            if 'JOIN_CONDITION:' in text:
-                join_start = text.find('JOIN_CONDITION:')
-                join_end = text.find('\n', join_start)
-                if join_end != -1:
-                    join_condition = text[join_start:join_end].replace('JOIN_CONDITION:', '').strip()
-
-            details['relationships'].append({
-                'description': text[:300] + '...' if len(text) > 300 else text,
-                'join_condition': join_condition,
-                'full_text': text,
-                'relevance_score': round(1 - distance, 3)
-            })
-
-            # Add to table relationships
-            if text not in details['tables'][table_name]['relationships']:
-                details['tables'][table_name]['relationships'].append(text[:150])
-
-        # Extract table info
-        elif entity_type == 'table':
-            if not details['tables'][table_name]['description']:
-                details['tables'][table_name]['description'] = text[:200] + '...' if len(text) > 200 else text
+        handler = get_handler(entity_type)
+        if handler:
+            handler(details, table_name, column_name, text, relevance)
 
     # Process procedural results (query examples)
-    for vec in procedural_results:
-        metadata = vec.get('metadata', {})
-        # Text is stored in metadata since S3 Vectors only returns metadata
-        text = metadata.get('text', '')
-        distance = vec.get('distance', 0)
+    procedural_matches = [Match.model_validate(v, from_attributes=True)
+                          for v in procedural_results]
 
-        # Extract SQL examples from text
+    add_example = details['example_queries'].append
+    for match, relevance in zip(procedural_matches, _relevance_scores(procedural_matches)):
+        metadata = match.metadata
+        text = metadata.text or metadata.preview
+
+        # Extract SQL examples: one regex pass over the EXAMPLES section
         sql_examples = []
-        if 'EXAMPLES:' in text:
-            examples_section = text.split('EXAMPLES:')[1]
-            # Split by bullet points or dashes
-            example_lines = [line.strip() for line in examples_section.split('\n') if line.strip().startswith('-')]
-            sql_examples = [line.lstrip('- ').strip() for line in example_lines if 'SELECT' in line.upper()]
+        examples_match = _EXAMPLES_RE.search(text)
+        if examples_match:
+            # Strip each line exactly once, then filter
+            stripped = (line.strip() for line in _EXAMPLE_LINE_RE.findall(examples_match.group(1)))
+            sql_examples = [line for line in stripped if 'SELECT' in line.upper()]
 
         # Extract use case description
-        use_case = ''
-        if 'DESCRIPTION:' in text:
-            desc_start = text.find('DESCRIPTION:')
-            desc_end = text.find('\n\n', desc_start)
-            if desc_end != -1:
-                use_case = text[desc_start:desc_end].replace('DESCRIPTION:', '').strip()
-
-        details['example_queries'].append({
-            'summary': text[:200] + '...' if len(text) > 200 else text,
+        desc_match = _DESCRIPTION_RE.search(text)
+        use_case = desc_match.group(1).strip() if desc_match else ''
+
+        add_example({
+            'summary': _truncate(text, 200),
             'use_case': use_case,
             'sql_examples': sql_examples,
-            'table': metadata.get('table_name', 'unknown'),
+            'table': metadata.table_name,
             'full_text': text,
-            'relevance_score': round(1 - distance, 3)
+            'relevance_score': relevance
         })
 
     return details
 
 
-def build_context(semantic_results: List[Dict], procedural_results: List[Dict]) -> str:
-    """Build context string from retrieved vectors"""
+# Preloaded once at import - encoding_for_model does registry lookups and
+# file loading that should not run per request
+_ENCODING = tiktoken.encoding_for_model('gpt-4o')
 
-    context_parts = []
+# Retrieved-context token budget: prompt cost and time-to-first-token both
+# scale with every token sent, so stop appending once the budget is spent
+MAX_CONTEXT_TOKENS = 3000
 
-    # Add semantic memory (schema information)
-    if semantic_results:
-        context_parts.append("=== DATABASE SCHEMA ===\n")
-        for vec in semantic_results:
-            text = vec.get('text', '')
-            metadata = vec.get('metadata', {})
-            table = metadata.get('table_name', 'unknown')
-            entity = metadata.get('entity_type', 'unknown')
-
-            context_parts.append(f"[{table}.{entity}]")
-            context_parts.append(text)
-            context_parts.append("")
-
-    # Add procedural memory (query examples)
-    if procedural_results:
-        context_parts.append("\n=== SIMILAR QUERY EXAMPLES ===\n")
-        for vec in procedural_results:
-            text = vec.get('text', '')
-            context_parts.append(text)
-            context_parts.append("")
 
-    return "\n".join(context_parts)
+def build_context(semantic_results, procedural_results) -> str:
+    """Build context string from retrieved vectors
 
+    Identical text blobs are deduplicated (the same table description
+    often comes back behind several matches) and appending stops at
+    MAX_CONTEXT_TOKENS. Results arrive most-relevant-first from the
+    retriever, so the cut drops the least relevant snippets.
+    """
 
-def generate_sql_query(question: str, context: str) -> Dict:
-    """Generate SQL query using OpenAI"""
+    sections = []
+    seen = set()
+    total_tokens = 0
+
+    # Semantic memory (schema information); text lives in metadata since
+    # S3 Vectors only returns metadata
+    if semantic_results:
+        sections.append("=== DATABASE SCHEMA ===\n")
+        for vec in semantic_results:
+            md = vec.get('metadata', {})
+            # text is hydrated from texts.sqlite by the retriever; fall
+            # back to the ingest preview if the side store lacks the row
+            text = md.get('text') or md.get('preview', '')
+            if not text or text in seen:
+                continue
+            tokens = len(_ENCODING.encode(text))
+            if total_tokens + tokens > MAX_CONTEXT_TOKENS:
+                break
+            seen.add(text)
+            total_tokens += tokens
+            sections.append(
+                f"[{md.get('table_name', 'unknown')}.{md.get('entity_type', 'unknown')}]\n{text}\n"
+            )
+
+    # Procedural memory (query examples)
+    if procedural_results and total_tokens < MAX_CONTEXT_TOKENS:
+        sections.append("\n=== SIMILAR QUERY EXAMPLES ===\n")
+        for vec in procedural_results:
+            md = vec.get('metadata', {})
+            text = md.get('text') or md.get('preview', '')
+            if not text or text in seen:
+                continue
+            tokens = len(_ENCODING.encode(text))
+            if total_tokens + tokens > MAX_CONTEXT_TOKENS:
+                break
+            seen.add(text)
+            total_tokens += tokens
+            sections.append(f"{text}\n")
 
-    prompt = f"""You are an expert SQL query generator for an e-commerce database.
+    return "\n".join(sections)
 
-Given the database schema and example queries below, generate a SQL query to answer the user's question.
 
-{context}
+# Static instruction block sent as the system message. Kept byte-identical
+# across requests (volatile content lives in the user message) so provider
+# prompt caching can reuse the prefix - cached tokens are cheaper and cut
+# time-to-first-token.
+SYSTEM_PROMPT = """You are an expert SQL query generator for an e-commerce database.
 
-User Question: {question}
+Given the database schema and example queries provided by the user, generate a SQL query to answer the user's question.
 
 Requirements:
 1. Generate ONLY valid SQL (PostgreSQL syntax)
@@ -227,30 +432,40 @@ Requirements:
 5. Consider the query examples for patterns
 
 Respond in this exact JSON format:
-{{
+{
     "sql_query": "your SQL query here",
     "explanation": "brief explanation of what the query does",
     "relevant_tables": ["table1", "table2"],
     "confidence": "high/medium/low"
-}}
+}
 
 Do not include any markdown formatting or code blocks - just the raw JSON."""
 
-    try:
-        # Call OpenAI
-        response = llm.invoke(prompt)
-        result_text = response.content
 
-        # Parse JSON response
-        import json
-        result = json.loads(result_text)
+def build_prompt(question: str, context: str) -> str:
+    """Build the volatile user message: retrieved context, then the question
 
-        return result
+    The question goes last so the stable part of the prompt stays as long
+    as possible for prefix caching.
+    """
+
+    return f"""{context}
+
+User Question: {question}"""
+
+
+async def generate_sql_query(question: str, context: str) -> Dict:
+    """Generate SQL query using OpenAI"""
+
+    prompt = build_prompt(question, context)
+
+    try:
+        # Await the LLM instead of blocking a threadpool worker on the
+        # OpenAI round-trip - concurrent requests share the event loop;
+        # structured outputs guarantee a schema-valid result
+        result = await structured_llm.ainvoke([("system", SYSTEM_PROMPT), ("human", prompt)])
+        return result.model_dump()
 
-    except json.JSONDecodeError as e:
-        logger.error(f"Failed to parse LLM response: {e}")
-        logger.error(f"Response text: {result_text}")
-        raise HTTPException(status_code=500, detail="Failed to parse LLM response")
     except Exception as e:
         logger.error(f"Query generation failed: {e}")
         raise HTTPException(status_code=500, detail=f"Query generation failed: {str(e)}")
@@ -285,7 +500,7 @@ def health_check():
 
 
 @app.post("/query", response_model=QueryResponse)
-def generate_query(request: QueryRequest):
+async def generate_query(request: QueryRequest):
     """
     Generate SQL query from natural language question
 
@@ -301,9 +516,18 @@ def generate_query(request: QueryRequest):
     try:
         logger.info(f"Received query: {request.question}")
 
+        cache_key = _response_cache_key(request)
+        cached = _response_cache.get(cache_key)
+        if cached is not None:
+            logger.info("Response cache hit - skipping retrieval and generation")
+            return cached
+
         # Step 1: Retrieve relevant context from S3 Vectors
+        # (boto3 is sync, so run the search off the event loop)
         r = get_retriever()
-        results = r.search_both(request.question, semantic_k=8, procedural_k=3)
+        results = await r.search_both_async(
+            request.question, semantic_k=8, procedural_k=3
+        )
 
         semantic_results = results['semantic']
         procedural_results = results['procedural']
@@ -317,10 +541,10 @@ def generate_query(request: QueryRequest):
         context = build_context(semantic_results, procedural_results)
 
         # Step 4: Generate SQL query using OpenAI
-        result = generate_sql_query(request.question, context)
+        result = await generate_sql_query(request.question, context)
 
-        # Step 5: Return response with context details
-        return QueryResponse(
+        # Step 5: Cache and return response with context details
+        response = QueryResponse(
             question=request.question,
             sql_query=result['sql_query'],
             explanation=result['explanation'],
@@ -328,6 +552,8 @@ def generate_query(request: QueryRequest):
             confidence=result['confidence'],
             context_used=context_details
         )
+        _response_cache[cache_key] = response
+        return response
 
     except HTTPException:
         raise
@@ -336,19 +562,122 @@ def generate_query(request: QueryRequest):
         raise HTTPException(status_code=500, detail=str(e))
 
 
+# Upper bound on questions per /query/batch call, so one request can't
+# monopolize the embedding API or the vector store
+MAX_BATCH_SIZE = 50
+
+# At most this many vector searches in flight for a single batch
+_BATCH_CONCURRENCY = 20
+
+
+class BatchQueryRequest(BaseModel):
+    """Request model for batched NL2SQL queries"""
+    questions: List[str]
+    database: Optional[str] = "ecommerce"
+
+
+@app.post("/query/batch", response_model=List[QueryResponse])
+async def generate_query_batch(request: BatchQueryRequest):
+    """
+    Generate SQL queries for a list of questions in one call.
+
+    All questions are embedded in a single OpenAI request and the vector
+    searches plus generations run concurrently, so a batch costs roughly
+    one embedding round-trip plus the slowest single pipeline instead of
+    N full serial pipelines.
+    """
+
+    if not request.questions:
+        return []
+    if len(request.questions) > MAX_BATCH_SIZE:
+        raise HTTPException(
+            status_code=422,
+            detail=f"Batch size {len(request.questions)} exceeds maximum {MAX_BATCH_SIZE}"
+        )
+
+    r = get_retriever()
+
+    # One OpenAI call embeds every question
+    embeddings = await r.embeddings.aembed_documents(request.questions)
+
+    semaphore = asyncio.Semaphore(_BATCH_CONCURRENCY)
+
+    async def process(question: str, embedding: List[float]) -> QueryResponse:
+        async with semaphore:
+            results = await r.search_by_embedding_async(
+                embedding, semantic_k=8, procedural_k=3)
+        context_details = extract_context_details(results['semantic'], results['procedural'])
+        context = build_context(results['semantic'], results['procedural'])
+        result = await generate_sql_query(question, context)
+        return QueryResponse(
+            question=question,
+            sql_query=result['sql_query'],
+            explanation=result['explanation'],
+            relevant_tables=result['relevant_tables'],
+            confidence=result['confidence'],
+            context_used=context_details
+        )
+
+    return list(await asyncio.gather(*(
+        process(q, e) for q, e in zip(request.questions, embeddings)
+    )))
+
+
+@app.post("/query/stream")
+async def stream_query(request: QueryRequest):
+    """
+    Stream the raw LLM response token-by-token.
+
+    /query has to wait for the full completion before it can parse and
+    validate the JSON; this endpoint trades structure for time-to-first-
+    byte so interactive clients can render the answer as it is generated.
+    """
+
+    r = get_retriever()
+    results = await r.search_both_async(
+        request.question, semantic_k=8, procedural_k=3
+    )
+    context = build_context(results['semantic'], results['procedural'])
+    prompt = build_prompt(request.question, context)
+
+    async def token_stream():
+        chunks = []
+        async for chunk in llm.astream([("system", SYSTEM_PROMPT), ("human", prompt)]):
+            if chunk.content:
+                chunks.append(chunk.content)
+                yield chunk.content
+        _validate_stream_payload(chunks)
+
+    return StreamingResponse(token_stream(), media_type="text/plain")
+
+
 @app.post("/query/explain")
-def explain_query(request: QueryRequest):
+async def explain_query(request: QueryRequest):
     """
     Generate SQL query with detailed explanation
     """
 
     try:
-        # Get the query first
-        query_result = generate_query(request)
-
-        # Add retrieval details
+        # Search once and reuse the results for both the query generation
+        # and the retrieval details - the old flow called generate_query
+        # and then re-ran the identical embed + search
         r = get_retriever()
-        results = r.search_both(request.question, semantic_k=8, procedural_k=3)
+        results = await r.search_both_async(
+            request.question, semantic_k=8, procedural_k=3
+        )
+
+        context_details = extract_context_details(results['semantic'], results['procedural'])
+        context = build_context(results['semantic'], results['procedural'])
+        result = await generate_sql_query(request.question, context)
+
+        query_result = QueryResponse(
+            question=request.question,
+            sql_query=result['sql_query'],
+            explanation=result['explanation'],
+            relevant_tables=result['relevant_tables'],
+            confidence=result['confidence'],
+            context_used=context_details
+        )
 
         return {
             "query": query_result.dict(),
@@ -376,5 +705,6 @@ if __name__ == "__main__":
         host="0.0.0.0",
         port=8001,
         reload=True,
+        loop="uvloop",
         log_level="info"
     )
\ No newline at end of file
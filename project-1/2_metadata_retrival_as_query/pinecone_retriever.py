@@ -3,17 +3,26 @@ Pinecone Vector Retrieval
 Query vectors from Pinecone index
 """
 
+import asyncio
 import os
-from typing import List, Dict
+import sqlite3
+import threading
+from typing import List, Dict, Optional
 import logging
 
-from pinecone import Pinecone
+from pinecone import Pinecone, PineconeAsyncio
 from langchain_openai import OpenAIEmbeddings
 
-logging.basicConfig(level=logging.INFO)
+from batched_embedder import BatchedEmbedder
+
+# Library module: handler/level configuration belongs to the entrypoint
 logger = logging.getLogger(__name__)
 
 
+# Maximum cached query embeddings before the oldest entry is evicted
+_EMBED_CACHE_SIZE = 4096
+
+
 class PineconeRetriever:
     """Retrieve vectors from Pinecone index"""
 
@@ -30,16 +39,134 @@ class PineconeRetriever:
 
         self.pc = Pinecone(api_key=api_key)
         self.index = self.pc.Index(index_name)
-        
+
+        # Async client and index handle, created lazily on the first async
+        # query - aiohttp sessions must be built inside a running event loop
+        self._api_key = api_key
+        self._async_pc = None
+        self._async_index = None
+
         # Initialize embeddings
         self.embeddings = OpenAIEmbeddings(model='text-embedding-3-small')
-        
+
+        # Query-embedding cache shared by the sync and async paths: repeat
+        # questions skip the paid ~100-300 ms OpenAI round-trip entirely.
+        # A plain insertion-ordered dict (oldest-first eviction) is used
+        # instead of functools.lru_cache so the async path can await
+        # aembed_query on a miss rather than hopping to a worker thread.
+        self._embed_cache: Dict[str, List[float]] = {}
+
+        # Dynamic batcher: concurrent async embed misses coalesce into one
+        # embed_documents call instead of N parallel embed_query calls
+        self._batcher = BatchedEmbedder(self.embeddings)
+
+        # Full chunk texts live in the ingestion side store; vector
+        # metadata carries only a short preview (see fetch_texts)
+        self._texts_db = sqlite3.connect('texts.sqlite', check_same_thread=False)
+        self._texts_db.execute(
+            'CREATE TABLE IF NOT EXISTS texts (chunk_id TEXT PRIMARY KEY, text TEXT)'
+        )
+        self._texts_lock = threading.Lock()
+
         logger.info(f"Initialized PineconeRetriever")
         logger.info(f"  Index: {index_name}")
 
-    def search_semantic(self, query: str, top_k: int = 8) -> List[Dict]:
-        """Search semantic memory (tables, columns, relationships)"""
-        query_embedding = self.embeddings.embed_query(query)
+        # Surface corpus size at startup: retrieval latency grows with the
+        # index, and past ~100k vectors it's worth confirming the index
+        # config (pod type / serverless ANN settings) still fits the load
+        try:
+            stats = self.index.describe_index_stats()
+            total = stats.get('total_vector_count', 0)
+            logger.info(f"  Vectors: {total}")
+            if total > 100_000:
+                logger.warning(
+                    f"Index holds {total} vectors - verify the index "
+                    "configuration is ANN-backed and sized for this corpus"
+                )
+        except Exception as e:
+            logger.warning(f"Could not fetch index stats: {e}")
+
+    def _cache_embedding(self, query: str, embedding: List[float]):
+        """Store an embedding, evicting the oldest entry at capacity"""
+        if len(self._embed_cache) >= _EMBED_CACHE_SIZE:
+            self._embed_cache.pop(next(iter(self._embed_cache)))
+        self._embed_cache[query] = embedding
+
+    def _embed(self, query: str) -> List[float]:
+        """Embed a query through the shared cache (sync path)"""
+        cached = self._embed_cache.get(query)
+        if cached is not None:
+            return cached
+        embedding = self.embeddings.embed_query(query)
+        self._cache_embedding(query, embedding)
+        return embedding
+
+    async def _aembed(self, query: str) -> List[float]:
+        """Embed a query through the shared cache (async path)"""
+        cached = self._embed_cache.get(query)
+        if cached is not None:
+            return cached
+        embedding = await self._batcher.embed(query)
+        self._cache_embedding(query, embedding)
+        return embedding
+
+    async def _get_async_index(self):
+        """Lazily create and reuse the asyncio index handle"""
+        if self._async_index is None:
+            host = self.pc.describe_index(self.index_name).host
+            self._async_pc = PineconeAsyncio(api_key=self._api_key)
+            self._async_index = self._async_pc.IndexAsyncio(host=host)
+        return self._async_index
+
+    def fetch_texts(self, chunk_ids: List[str]) -> Dict[str, str]:
+        """Hydrate full chunk texts for the ids that are actually used
+
+        Ingestion keeps the heavy `text` field out of vector metadata (a
+        256-char preview ships instead) and parks the full text in the
+        texts.sqlite side store keyed by chunk_id. Callers that need
+        complete chunk bodies pull just those rows here, keeping the
+        query payload proportional to top_k * preview_len rather than
+        top_k * full_text_len.
+        """
+        if not chunk_ids:
+            return {}
+        placeholders = ','.join('?' * len(chunk_ids))
+        with self._texts_lock:
+            rows = self._texts_db.execute(
+                f'SELECT chunk_id, text FROM texts WHERE chunk_id IN ({placeholders})',
+                list(chunk_ids)).fetchall()
+        return dict(rows)
+
+    def _hydrate(self, matches: List[Dict]) -> List[Dict]:
+        """Restore full texts onto search results from the side store
+
+        Downstream consumers (build_context, extract_context_details)
+        read metadata['text'], so each result batch pulls exactly its
+        own full texts and falls back to the preview for any row the
+        store doesn't have. Vectors from older ingestions that still
+        carry full text in metadata pass through untouched.
+        """
+        wanted = [m['id'] for m in matches
+                  if m.get('id') and 'text' not in m.get('metadata', {})]
+        if not wanted:
+            return matches
+        texts = self.fetch_texts(wanted)
+        for match in matches:
+            metadata = match.get('metadata')
+            if metadata is None or 'text' in metadata:
+                continue
+            metadata['text'] = (texts.get(match.get('id'))
+                                or metadata.get('preview', ''))
+        return matches
+
+    def search_semantic(self, query: str, top_k: int = 8,
+                        embedding: Optional[List[float]] = None) -> List[Dict]:
+        """Search semantic memory (tables, columns, relationships)
+
+        Pass a pre-computed `embedding` to skip the OpenAI call - search_both
+        embeds the query once and shares it across both memory types.
+        """
+        query_embedding = embedding if embedding is not None else self._embed(query)
 
         try:
             # Query with filter for semantic memory
@@ -50,7 +177,7 @@ class PineconeRetriever:
                 include_metadata=True
             )
             
-            vectors = response.get('matches', [])
+            vectors = self._hydrate(response.get('matches', []))
             logger.info(f"Found {len(vectors)} semantic results")
             
             # Debug: check if text is in metadata
@@ -62,25 +189,23 @@ class PineconeRetriever:
                 else:
                     logger.warning(f"✗ Text NOT found in metadata")
             
-            # Convert Pinecone format to our standard format
-            results = []
-            for match in vectors:
-                results.append({
-                    'id': match.get('id'),
-                    'score': match.get('score'),  # Pinecone returns score (0-1, higher is better)
-                    'metadata': match.get('metadata', {})
-                })
-            
-            return results
+            # Return the match objects directly - they are dict-like
+            # (.get works downstream), so re-wrapping each one in a new
+            # dict is a pointless copy per vector
+            return vectors
             
         except Exception as e:
             logger.error(f"Semantic search failed: {e}")
             logger.exception("Full error:")
             return []
 
-    def search_procedural(self, query: str, top_k: int = 3) -> List[Dict]:
-        """Search procedural memory (query examples)"""
-        query_embedding = self.embeddings.embed_query(query)
+    def search_procedural(self, query: str, top_k: int = 3,
+                          embedding: Optional[List[float]] = None) -> List[Dict]:
+        """Search procedural memory (query examples)
+
+        Pass a pre-computed `embedding` to skip the OpenAI call.
+        """
+        query_embedding = embedding if embedding is not None else self._embed(query)
 
         try:
             # Query with filter for procedural memory
@@ -91,7 +216,7 @@ class PineconeRetriever:
                 include_metadata=True
             )
             
-            vectors = response.get('matches', [])
+            vectors = self._hydrate(response.get('matches', []))
             logger.info(f"Found {len(vectors)} procedural results")
             
             # Debug: check for text in metadata
@@ -103,36 +228,87 @@ class PineconeRetriever:
                 else:
                     logger.warning(f"✗ Text NOT found in metadata")
             
-            # Convert Pinecone format to our standard format
-            results = []
-            for match in vectors:
-                results.append({
-                    'id': match.get('id'),
-                    'score': match.get('score'),
-                    'metadata': match.get('metadata', {})
-                })
-            
-            return results
+            # Return the match objects directly (see search_semantic)
+            return vectors
             
         except Exception as e:
             logger.error(f"Procedural search failed: {e}")
             logger.exception("Full error:")
             return []
 
+    def _partition_matches(self, matches: List, semantic_k: int, procedural_k: int) -> Dict:
+        """Split combined-query matches by memory_type, truncating each side"""
+        semantic, procedural = [], []
+        matches = self._hydrate(matches)
+        for match in matches:
+            memory_type = match.get('metadata', {}).get('memory_type')
+            if memory_type == 'semantic' and len(semantic) < semantic_k:
+                semantic.append(match)
+            elif memory_type == 'procedural' and len(procedural) < procedural_k:
+                procedural.append(match)
+
+        logger.info(f"Total retrieved: {len(semantic)} semantic + {len(procedural)} procedural")
+
+        return {'semantic': semantic, 'procedural': procedural}
+
+    def _query_combined(self, embedding: List[float], semantic_k: int,
+                        procedural_k: int) -> Dict:
+        """One unfiltered Pinecone query covering both memory types
+
+        Both memory types live in the same index, so one query with a
+        combined top_k (plus slack, since one type can crowd out the other
+        near the cut-off) replaces two filtered HTTP round-trips; the
+        results are partitioned client-side by metadata['memory_type'].
+        """
+        response = self.index.query(
+            vector=embedding,
+            top_k=semantic_k + procedural_k + 4,
+            include_metadata=True
+        )
+        return self._partition_matches(
+            response.get('matches', []), semantic_k, procedural_k)
+
     def search_both(self, query: str, semantic_k: int = 8, procedural_k: int = 3) -> Dict:
-        """Search both memory types"""
+        """Search both memory types
+
+        The query is embedded once (one OpenAI call instead of two) and a
+        single combined Pinecone query serves both memory types, so the
+        whole retrieval costs one embed plus one vector-store round-trip.
+        """
         logger.info(f"Searching for: '{query}'")
         logger.info(f"  Semantic top-k: {semantic_k}")
         logger.info(f"  Procedural top-k: {procedural_k}")
-        
-        results = {
-            'semantic': self.search_semantic(query, semantic_k),
-            'procedural': self.search_procedural(query, procedural_k)
-        }
-        
-        logger.info(f"Total retrieved: {len(results['semantic'])} semantic + {len(results['procedural'])} procedural")
-        
-        return results
+
+        embedding = self._embed(query)
+        return self._query_combined(embedding, semantic_k, procedural_k)
+
+    async def search_by_embedding_async(self, embedding: List[float],
+                                        semantic_k: int = 8,
+                                        procedural_k: int = 3) -> Dict:
+        """Async combined search for a pre-computed query embedding
+
+        Lets batch callers embed many questions in one OpenAI call and fan
+        the vector queries out concurrently.
+        """
+        index = await self._get_async_index()
+        response = await index.query(
+            vector=embedding,
+            top_k=semantic_k + procedural_k + 4,
+            include_metadata=True
+        )
+        return self._partition_matches(
+            response.get('matches', []), semantic_k, procedural_k)
+
+    async def search_both_async(self, query: str, semantic_k: int = 8,
+                                procedural_k: int = 3) -> Dict:
+        """Async variant of search_both for use inside async endpoints
+
+        Uses the SDK's asyncio client so the query is awaited natively on
+        aiohttp - no asyncio.to_thread hop, no worker-pool contention.
+        """
+        embedding = await self._aembed(query)
+        return await self.search_by_embedding_async(
+            embedding, semantic_k, procedural_k)
 
     def get_stats(self) -> Dict:
         """Get index statistics"""
@@ -3,19 +3,140 @@ S3 Vector Retrieval - Updated with Debug Logging
 Query vectors from S3 vector indexes
 """
 
+import asyncio
 import boto3
-from typing import List, Dict
+import functools
+import hashlib
+import sqlite3
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import List, Dict, Optional
 import logging
 import json
 
+import numpy as np
+
+from botocore.config import Config
 from langchain_openai import OpenAIEmbeddings
 
-logging.basicConfig(level=logging.INFO)
+from batched_embedder import BatchedEmbedder
+
+# Library module: handler/level configuration belongs to the entrypoint
 logger = logging.getLogger(__name__)
 
 
+# One pooled s3vectors client per region, shared by every retriever in the
+# process: the default client keeps a small pool and standard retries, which
+# churns TLS handshakes and stalls on throttling under query load
+_S3V_CLIENT_CONFIG = Config(
+    max_pool_connections=50,
+    retries={'max_attempts': 5, 'mode': 'adaptive'},
+    tcp_keepalive=True,
+)
+_s3v_clients = {}
+_s3v_clients_lock = threading.Lock()
+
+
+def _get_s3vectors_client(region: str):
+    """Shared per-region client - boto3 clients are thread-safe"""
+    with _s3v_clients_lock:
+        client = _s3v_clients.get(region)
+        if client is None:
+            client = _s3v_clients[region] = boto3.client(
+                's3vectors', region_name=region, config=_S3V_CLIENT_CONFIG)
+        return client
+
+
+# Semantic results cache: similarity threshold, entry lifetime, capacity
+_SEMCACHE_THRESHOLD = 0.92
+_SEMCACHE_TTL = 3600
+_SEMCACHE_MAX = 5000
+
+
+class SemanticQueryCache:
+    """Similarity cache over recent query embeddings
+
+    Paraphrased questions ("customers in California" vs "CA customers")
+    land near each other in embedding space; when a cached query clears
+    the cosine threshold and is younger than the TTL, its stored search
+    results are returned and both S3 round-trips are skipped. At this
+    scale a brute-force NumPy matmul over a few thousand normalized
+    vectors takes microseconds, so no ANN library is needed.
+
+    Cached vectors are stored int8-quantized (symmetric max-abs scale
+    per vector), cutting the ring buffer from 6 KB to 1.5 KB per entry -
+    at capacity that's ~7.5 MB instead of 30 MB, which keeps the scan
+    resident in cache. Quantization error is well below the 0.92
+    similarity threshold's margin.
+    """
+
+    def __init__(self, dimension: int = 1536, max_entries: int = _SEMCACHE_MAX,
+                 threshold: float = _SEMCACHE_THRESHOLD, ttl: int = _SEMCACHE_TTL):
+        self.threshold = threshold
+        self.ttl = ttl
+        self.max_entries = max_entries
+        # Ring buffer: oldest entries are overwritten at capacity.
+        # int8 codes plus a per-vector dequantization scale reconstruct
+        # the dot product as (codes @ query) * scale.
+        self._vectors = np.zeros((max_entries, dimension), dtype=np.int8)
+        self._scales = np.zeros(max_entries, dtype=np.float32)
+        self._entries = [None] * max_entries
+        self._count = 0
+        self._pos = 0
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _normalize(embedding) -> np.ndarray:
+        v = np.asarray(embedding, dtype=np.float32)
+        norm = np.linalg.norm(v)
+        return v / norm if norm else v
+
+    @staticmethod
+    def _quantize(v: np.ndarray):
+        """Symmetric scalar quantization: int8 codes + dequant scale"""
+        max_abs = float(np.abs(v).max())
+        if max_abs == 0.0:
+            return np.zeros(v.shape, dtype=np.int8), 0.0
+        codes = np.round(v * (127.0 / max_abs)).astype(np.int8)
+        return codes, max_abs / 127.0
+
+    def get(self, embedding):
+        """Return cached results for a similar-enough, fresh query, else None"""
+        with self._lock:
+            if self._count == 0:
+                return None
+            # int8 @ float32 promotes to float32 in the matmul itself;
+            # no float copy of the ring buffer is materialized
+            sims = (self._vectors[:self._count] @ self._normalize(embedding))
+            sims *= self._scales[:self._count]
+            best = int(np.argmax(sims))
+            if sims[best] < self.threshold:
+                return None
+            ts, results = self._entries[best]
+            if time.time() - ts > self.ttl:
+                return None
+            return results
+
+    def put(self, embedding, results):
+        """Store results for this query embedding"""
+        codes, scale = self._quantize(self._normalize(embedding))
+        with self._lock:
+            self._vectors[self._pos] = codes
+            self._scales[self._pos] = scale
+            self._entries[self._pos] = (time.time(), results)
+            self._pos = (self._pos + 1) % self.max_entries
+            self._count = min(self._count + 1, self.max_entries)
+
+
 class S3VectorRetriever:
-    """Retrieve vectors from S3 vector indexes"""
+    """Retrieve vectors from S3 vector indexes
+
+    S3 Vectors exposes no tunable ANN index; query latency grows with the
+    corpus, so for collections beyond roughly 10k vectors prefer the
+    Pinecone deployment (PineconeRetriever / nl2sql_api_pinecone), which
+    serves sub-linear ANN lookups.
+    """
 
     def __init__(
         self,
@@ -26,16 +147,98 @@ class S3VectorRetriever:
         self.semantic_bucket = semantic_bucket
         self.procedural_bucket = procedural_bucket
 
-        self.s3vectors = boto3.client('s3vectors', region_name=aws_region)
+        self.s3vectors = _get_s3vectors_client(aws_region)
         self.embeddings = OpenAIEmbeddings(model='text-embedding-3-small')
 
-        logger.info(f"Initialized S3VectorRetriever")
-        logger.info(f"  Semantic bucket: {semantic_bucket}")
-        logger.info(f"  Procedural bucket: {procedural_bucket}")
+        # Two-tier query-embedding cache: an in-process LRU in front of a
+        # sqlite store (same shape as the ingestion scripts' embed cache),
+        # so embeddings survive process restarts. Keys hash the model name
+        # together with the query text, which makes a stale hit after a
+        # model change structurally impossible.
+        self._embed = functools.lru_cache(maxsize=2048)(self._embed_uncached)
+        self._embed_db = sqlite3.connect('query_embed_cache.db', check_same_thread=False)
+        self._embed_db.execute(
+            'CREATE TABLE IF NOT EXISTS embeddings (hash BLOB PRIMARY KEY, vec BLOB)'
+        )
+        self._embed_db_lock = threading.Lock()
+
+        # Dynamic batcher: concurrent async embed misses coalesce into one
+        # embed_documents call instead of N parallel embed_query calls
+        self._batcher = BatchedEmbedder(self.embeddings)
+
+        # Similarity cache over full search_both results; bound to this
+        # instance (and therefore one embedding model), so a model change
+        # cannot surface stale hits
+        self._semantic_cache = SemanticQueryCache()
+
+        # Reused pair-query pool: S3 Vectors has no multi-index query
+        # call, so search_both fans out over two worker threads; keeping
+        # the pool on the instance avoids spawning threads per query
+        self._search_pool = ThreadPoolExecutor(
+            max_workers=2, thread_name_prefix='s3v-search')
+
+        # Full chunk texts live in the ingestion side store; vector
+        # metadata carries only a short preview (see fetch_texts)
+        self._texts_db = sqlite3.connect('texts.sqlite', check_same_thread=False)
+        # Create the schema if the side store hasn't been populated yet,
+        # so hydration degrades to previews instead of raising
+        self._texts_db.execute(
+            'CREATE TABLE IF NOT EXISTS texts (chunk_id TEXT PRIMARY KEY, text TEXT)'
+        )
+        self._texts_lock = threading.Lock()
+
+        logger.info("Initialized S3VectorRetriever")
+        logger.info("  Semantic bucket: %s", semantic_bucket)
+        logger.info("  Procedural bucket: %s", procedural_bucket)
+        logger.info(
+            "  Note: S3 Vectors query latency grows with corpus size; "
+            "use the Pinecone backend for collections beyond ~10k vectors"
+        )
+
+    def _embed_uncached(self, query: str) -> List[float]:
+        """Disk-cache tier behind the in-process LRU"""
+        key = hashlib.sha256(
+            f"{self.embeddings.model}\x00{query}".encode()).digest()
+        with self._embed_db_lock:
+            row = self._embed_db.execute(
+                'SELECT vec FROM embeddings WHERE hash = ?', (key,)).fetchone()
+        if row is not None:
+            return np.frombuffer(row[0], dtype=np.float32).tolist()
+
+        embedding = self.embeddings.embed_query(query)
+        blob = np.asarray(embedding, dtype=np.float32).tobytes()
+        with self._embed_db_lock:
+            self._embed_db.execute(
+                'INSERT OR REPLACE INTO embeddings VALUES (?, ?)', (key, blob))
+            self._embed_db.commit()
+        return embedding
 
-    def search_semantic(self, query: str, top_k: int = 8) -> List[Dict]:
-        """Search semantic memory"""
-        query_embedding = self.embeddings.embed_query(query)
+    async def _aembed(self, query: str) -> List[float]:
+        """Async embed path: disk-cache lookup, then the shared batcher"""
+        key = hashlib.sha256(
+            f"{self.embeddings.model}\x00{query}".encode()).digest()
+        with self._embed_db_lock:
+            row = self._embed_db.execute(
+                'SELECT vec FROM embeddings WHERE hash = ?', (key,)).fetchone()
+        if row is not None:
+            return np.frombuffer(row[0], dtype=np.float32).tolist()
+
+        embedding = await self._batcher.embed(query)
+        blob = np.asarray(embedding, dtype=np.float32).tobytes()
+        with self._embed_db_lock:
+            self._embed_db.execute(
+                'INSERT OR REPLACE INTO embeddings VALUES (?, ?)', (key, blob))
+            self._embed_db.commit()
+        return embedding
+
+    def search_semantic(self, query: str, top_k: int = 8,
+                        embedding: Optional[List[float]] = None) -> List[Dict]:
+        """Search semantic memory
+
+        Pass a pre-computed `embedding` to skip the OpenAI call - search_both
+        embeds the query once and shares it across both memory types.
+        """
+        query_embedding = embedding if embedding is not None else self._embed(query)
 
         try:
             response = self.s3vectors.query_vectors(
@@ -47,24 +250,20 @@ class S3VectorRetriever:
                 returnMetadata=True
                 # returnData is NOT a valid parameter - removed
             )
-            print("search_semantic response",response)
-
-            vectors = response.get('vectors', [])
-            logger.info(f"Found {len(vectors)} semantic results")
+            vectors = self._hydrate(response.get('vectors', []))
+            logger.debug("Found %d semantic results", len(vectors))
 
-            # Debug: log what we got
-            if vectors:
+            # Key-list introspection allocates; only do it when DEBUG output
+            # will actually be emitted
+            if vectors and logger.isEnabledFor(logging.DEBUG):
                 sample = vectors[0]
-                logger.debug(f"Sample vector keys: {list(sample.keys())}")
-                logger.debug(f"Sample metadata keys: {list(sample.get('metadata', {}).keys())}")
-
-                # Check if text is in metadata
+                logger.debug("Sample vector keys: %s", list(sample.keys()))
+                logger.debug("Sample metadata keys: %s", list(sample.get('metadata', {}).keys()))
                 if 'metadata' in sample and 'text' in sample['metadata']:
-                    text_len = len(sample['metadata']['text'])
-                    logger.info(f"✓ Text found in metadata (length: {text_len} chars)")
+                    logger.debug("Text found in metadata (length: %d chars)",
+                                 len(sample['metadata']['text']))
                 else:
-                    logger.warning(f"✗ Text NOT found in metadata - re-run ingestion!")
-                    logger.warning(f"  Available metadata keys: {list(sample.get('metadata', {}).keys())}")
+                    logger.warning("Text NOT found in metadata - re-run ingestion!")
 
             return vectors
 
@@ -73,9 +272,13 @@ class S3VectorRetriever:
             logger.exception("Full error:")
             return []
 
-    def search_procedural(self, query: str, top_k: int = 3) -> List[Dict]:
-        """Search procedural memory"""
-        query_embedding = self.embeddings.embed_query(query)
+    def search_procedural(self, query: str, top_k: int = 3,
+                          embedding: Optional[List[float]] = None) -> List[Dict]:
+        """Search procedural memory
+
+        Pass a pre-computed `embedding` to skip the OpenAI call.
+        """
+        query_embedding = embedding if embedding is not None else self._embed(query)
 
         try:
             response = self.s3vectors.query_vectors(
@@ -87,19 +290,16 @@ class S3VectorRetriever:
                 returnMetadata=True
                 # returnData is NOT a valid parameter - removed
             )
-            print("search_procedural response", response)
-
-            vectors = response.get('vectors', [])
-            logger.info(f"Found {len(vectors)} procedural results")
+            vectors = self._hydrate(response.get('vectors', []))
+            logger.debug("Found %d procedural results", len(vectors))
 
-            # Debug: check for text in metadata
-            if vectors:
+            if vectors and logger.isEnabledFor(logging.DEBUG):
                 sample = vectors[0]
                 if 'metadata' in sample and 'text' in sample['metadata']:
-                    text_len = len(sample['metadata']['text'])
-                    logger.info(f"✓ Text found in metadata (length: {text_len} chars)")
+                    logger.debug("Text found in metadata (length: %d chars)",
+                                 len(sample['metadata']['text']))
                 else:
-                    logger.warning(f"✗ Text NOT found in metadata - re-run ingestion!")
+                    logger.warning("Text NOT found in metadata - re-run ingestion!")
 
             return vectors
 
@@ -108,17 +308,129 @@ class S3VectorRetriever:
             logger.exception("Full error:")
             return []
 
+    def fetch_texts(self, chunk_ids: List[str]) -> Dict[str, str]:
+        """Hydrate full chunk texts for the ids that are actually used
+
+        S3 Vectors' returnMetadata flag is all-or-nothing, so ingestion
+        keeps the heavy `text` field out of vector metadata (a 256-char
+        preview ships instead) and parks the full text in the
+        texts.sqlite side store. Callers that need complete chunk bodies
+        pull just those rows here, keeping the query_vectors payload
+        proportional to top_k * preview_len rather than top_k *
+        full_text_len.
+        """
+        if not chunk_ids:
+            return {}
+        placeholders = ','.join('?' * len(chunk_ids))
+        with self._texts_lock:
+            rows = self._texts_db.execute(
+                f'SELECT chunk_id, text FROM texts WHERE chunk_id IN ({placeholders})',
+                list(chunk_ids)).fetchall()
+        return dict(rows)
+
+    def _hydrate(self, vectors: List[Dict]) -> List[Dict]:
+        """Restore full texts onto search results from the side store
+
+        Downstream consumers (build_context, extract_context_details)
+        read metadata['text'], so each result batch pulls exactly its
+        own full texts via fetch_texts and falls back to the preview
+        for any row the store doesn't have. Vectors from older
+        ingestions that still carry full text pass through untouched.
+        """
+        wanted = [v['key'] for v in vectors
+                  if v.get('key') and 'text' not in v.get('metadata', {})]
+        if not wanted:
+            return vectors
+        texts = self.fetch_texts(wanted)
+        for vector in vectors:
+            metadata = vector.get('metadata')
+            if metadata is None or 'text' in metadata:
+                continue
+            metadata['text'] = (texts.get(vector.get('key'))
+                                or metadata.get('preview', ''))
+        return vectors
+
     def search_both(self, query: str, semantic_k: int = 8, procedural_k: int = 3) -> Dict:
-        """Search both memory types"""
-        logger.info(f"Searching for: '{query}'")
-        logger.info(f"  Semantic top-k: {semantic_k}")
-        logger.info(f"  Procedural top-k: {procedural_k}")
+        """Search both memory types
+
+        The query is embedded once (one OpenAI call instead of two) and the
+        two S3 Vectors queries run concurrently, so wall clock is
+        T_embed + max(T_query) rather than 2*(T_embed + T_query).
+        """
+        logger.debug("Searching for: '%s' (semantic_k=%d, procedural_k=%d)",
+                     query, semantic_k, procedural_k)
 
+        embedding = self._embed(query)
+
+        cached = self._semantic_cache.get(embedding)
+        if cached is not None:
+            logger.debug("Semantic cache hit - skipping S3 queries")
+            return cached
+
+        semantic_future = self._search_pool.submit(
+            self.search_semantic, query, semantic_k, embedding)
+        procedural_future = self._search_pool.submit(
+            self.search_procedural, query, procedural_k, embedding)
         results = {
-            'semantic': self.search_semantic(query, semantic_k),
-            'procedural': self.search_procedural(query, procedural_k)
+            'semantic': semantic_future.result(),
+            'procedural': procedural_future.result()
         }
 
-        logger.info(f"Total retrieved: {len(results['semantic'])} semantic + {len(results['procedural'])} procedural")
+        logger.debug("Total retrieved: %d semantic + %d procedural",
+                     len(results['semantic']), len(results['procedural']))
+
+        self._semantic_cache.put(embedding, results)
+        return results
+
+    async def asearch_semantic(self, query: str, top_k: int = 8) -> List[Dict]:
+        """Async search_semantic: embed via the batcher, query in a thread
+
+        Neither the OpenAI call nor boto3's query_vectors runs on the
+        event loop, so agent middleware and token streaming keep
+        interleaving while the network I/O is in flight.
+        """
+        embedding = await self._aembed(query)
+        return await asyncio.to_thread(
+            self.search_semantic, query, top_k, embedding)
+
+    async def asearch_procedural(self, query: str, top_k: int = 3) -> List[Dict]:
+        """Async search_procedural; see asearch_semantic"""
+        embedding = await self._aembed(query)
+        return await asyncio.to_thread(
+            self.search_procedural, query, top_k, embedding)
+
+    async def search_by_embedding_async(self, embedding: List[float],
+                                        semantic_k: int = 8,
+                                        procedural_k: int = 3) -> Dict:
+        """Async search for a pre-computed query embedding
+
+        Lets batch callers embed many questions in one OpenAI call and fan
+        the vector queries out concurrently.
+        """
+        cached = self._semantic_cache.get(embedding)
+        if cached is not None:
+            logger.debug("Semantic cache hit - skipping S3 queries")
+            return cached
+
+        semantic, procedural = await asyncio.gather(
+            asyncio.to_thread(self.search_semantic, '', semantic_k, embedding),
+            asyncio.to_thread(self.search_procedural, '', procedural_k, embedding),
+        )
+
+        logger.debug("Total retrieved: %d semantic + %d procedural",
+                     len(semantic), len(procedural))
+
+        results = {'semantic': semantic, 'procedural': procedural}
+        self._semantic_cache.put(embedding, results)
+        return results
+
+    async def search_both_async(self, query: str, semantic_k: int = 8,
+                                procedural_k: int = 3) -> Dict:
+        """Async variant of search_both for use inside async endpoints
 
-        return results
\ No newline at end of file
+        Embeds once via aembed_query, then fans the two boto3 queries out
+        with asyncio.gather so neither blocks the event loop.
+        """
+        embedding = await self._aembed(query)
+        return await self.search_by_embedding_async(
+            embedding, semantic_k, procedural_k)
\ No newline at end of file
@@ -2,35 +2,88 @@
 Test Client for NL2SQL API with Pinecone
 """
 
+import hashlib
+import httpx
+import orjson
 import requests
-import json
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+# (connect, read) timeouts so a hung server doesn't block the test loop
+REQUEST_TIMEOUT = (3, 30)
 
 
 class NL2SQLPineconeClient:
     """Client for NL2SQL API with Pinecone"""
-    
+
     def __init__(self, base_url: str = "http://localhost:8002"):
         self.base_url = base_url
+        # Persistent session: reuses TCP+TLS connections across calls and
+        # retries transient 429/5xx responses transparently
+        self.session = requests.Session()
+        adapter = HTTPAdapter(
+            pool_connections=10,
+            pool_maxsize=50,
+            max_retries=Retry(
+                total=3,
+                backoff_factor=0.2,
+                status_forcelist=[429, 502, 503, 504],
+            ),
+        )
+        self.session.mount('http://', adapter)
+        self.session.mount('https://', adapter)
+        # Client-side response memo: repeated questions in a test sweep
+        # cost one API call instead of N
+        self._query_cache = {}
 
     def health_check(self):
         """Check API health"""
-        response = requests.get(f"{self.base_url}/health")
-        return response.json()
+        response = self.session.get(
+            f"{self.base_url}/health", timeout=REQUEST_TIMEOUT
+        )
+        return orjson.loads(response.content)
+
+    @staticmethod
+    def _cache_key(question: str, database: str) -> bytes:
+        return hashlib.sha256(f"{question}\x00{database}".encode()).digest()
 
     def generate_query(self, question: str, database: str = "ecommerce"):
         """Generate SQL query from natural language"""
+        key = self._cache_key(question, database)
+        cached = self._query_cache.get(key)
+        if cached is not None:
+            return cached
+
         payload = {
             "question": question,
             "database": database
         }
 
-        response = requests.post(
+        response = self.session.post(
             f"{self.base_url}/query",
-            json=payload
+            json=payload,
+            timeout=REQUEST_TIMEOUT
         )
 
         if response.status_code == 200:
-            return response.json()
+            result = orjson.loads(response.content)
+            self._query_cache[key] = result
+            return result
+        else:
+            print(f"Error: {response.status_code}")
+            print(response.text)
+            return None
+
+    async def agenerate_query(self, question: str, database: str = "ecommerce"):
+        """Async variant of generate_query for concurrent calls"""
+        async with httpx.AsyncClient(timeout=30) as http:
+            response = await http.post(
+                f"{self.base_url}/query",
+                json={"question": question, "database": database},
+            )
+
+        if response.status_code == 200:
+            return orjson.loads(response.content)
         else:
             print(f"Error: {response.status_code}")
             print(response.text)
@@ -40,13 +93,14 @@ class NL2SQLPineconeClient:
         """Get query with detailed explanation"""
         payload = {"question": question}
 
-        response = requests.post(
+        response = self.session.post(
             f"{self.base_url}/query/explain",
-            json=payload
+            json=payload,
+            timeout=REQUEST_TIMEOUT
         )
 
         if response.status_code == 200:
-            return response.json()
+            return orjson.loads(response.content)
         else:
             print(f"Error: {response.status_code}")
             print(response.text)
@@ -60,7 +114,7 @@ def main():
 
     # Health check
     print("Health Check:")
-    print(json.dumps(client.health_check(), indent=2))
+    print(orjson.dumps(client.health_check(), option=orjson.OPT_INDENT_2).decode())
     print("\n" + "="*70 + "\n")
 
     # Test queries
@@ -0,0 +1,72 @@
+"""
+One-shot backfill: stamp metadata["namespace"] onto existing vectors.
+
+_do_search and search_pair filter server-side on metadata["namespace"],
+a field _do_put only started writing when the filters were introduced.
+Vectors upserted before that never match the filter and silently drop
+out of retrieval. Their ids already encode the namespace as
+"<namespace>:<key>", so this script walks the index and writes the
+missing field back with metadata-only updates - no re-embedding, no
+vector payload.
+
+Safe to re-run: vectors that already carry the field are skipped.
+
+Usage:
+    PINECONE_API_KEY=... python backfill_namespace_metadata.py [index_name]
+"""
+
+import os
+import sys
+import logging
+
+from pinecone import Pinecone
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+DEFAULT_INDEX = 'nl2sql-semantic-memory'
+
+# Ids fetched per round-trip; matches Pinecone's fetch sweet spot
+FETCH_BATCH = 100
+
+
+def backfill(index_name: str = DEFAULT_INDEX) -> None:
+    """Backfill metadata["namespace"] for every vector missing it."""
+    api_key = os.getenv('PINECONE_API_KEY')
+    if not api_key:
+        raise ValueError("PINECONE_API_KEY environment variable not set")
+
+    pc = Pinecone(api_key=api_key)
+    index = pc.Index(index_name)
+
+    scanned = 0
+    updated = 0
+    skipped = 0
+
+    for id_batch in index.list(limit=FETCH_BATCH):
+        result = index.fetch(ids=list(id_batch))
+        for vector_id, vector in result.get('vectors', {}).items():
+            scanned += 1
+            metadata = vector.get('metadata') or {}
+            if metadata.get('namespace'):
+                continue
+
+            ns, sep, _ = vector_id.partition(':')
+            if not sep:
+                # Not one of this store's ids; leave it alone
+                logger.warning("Skipping id without namespace prefix: %s", vector_id)
+                skipped += 1
+                continue
+
+            index.update(id=vector_id, set_metadata={'namespace': ns})
+            updated += 1
+
+        logger.info("Progress: %d scanned, %d updated", scanned, updated)
+
+    logger.info(
+        "Backfill complete: %d scanned, %d updated, %d skipped",
+        scanned, updated, skipped)
+
+
+if __name__ == '__main__':
+    backfill(sys.argv[1] if len(sys.argv) > 1 else DEFAULT_INDEX)
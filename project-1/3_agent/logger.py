@@ -3,11 +3,14 @@ Logger configuration for NL2SQL agent
 """
 
 import logging
+import os
 import sys
 
-# Configure logging
+# Configure logging once for the whole agent; every other module should
+# only call logging.getLogger(__name__). Production can set LOG_LEVEL
+# (e.g. WARNING) to silence the per-query INFO chatter in hot paths.
 logging.basicConfig(
-    level=logging.INFO,
+    level=getattr(logging, os.getenv('LOG_LEVEL', 'INFO').upper(), logging.INFO),
     format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
     handlers=[
         logging.StreamHandler(sys.stdout),
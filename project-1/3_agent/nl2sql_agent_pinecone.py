@@ -5,78 +5,19 @@ Follows the pattern from your example - imports config, builds agent async
 
 from __future__ import annotations
 
+import asyncio
 import logging
+from typing import Optional
+
 from langchain.agents import create_agent
 
-from nl2sql_config import llm, store
+import logger as _log_config  # noqa: F401 - centralized handler/level setup
+from nl2sql_config import SYSTEM_PROMPT, SYSTEM_PROMPT_TOKENS, llm, store
 from nl2sql_semantic_recall import NL2SQLSemanticRecallMiddleware
 
-logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
 
-# Enhanced system prompt
-SYSTEM_PROMPT = """You are an expert PostgreSQL query generator for an e-commerce database.
-
-**Your Task:**
-Convert natural language questions into accurate, executable SQL queries.
-
-**Database Schema:**
-You will receive detailed schema information including:
-• Table definitions and purposes
-• Column names, data types, and constraints  
-• Foreign key relationships and join patterns
-• Real-world query examples and patterns
-
-**SQL Generation Rules:**
-
-1. **Accuracy First**
-   - Use exact table and column names from the schema
-   - Respect data types and constraints
-   - Include all necessary JOINs
-
-2. **Query Structure**
-   - Start with SELECT for retrieval queries
-   - Use WHERE for filtering conditions
-   - Apply JOINs for multi-table queries
-   - Add GROUP BY for aggregations
-   - Include ORDER BY for sorting
-   - Use LIMIT for pagination
-
-3. **PostgreSQL Syntax**
-   - Use PostgreSQL-specific functions when needed
-   - Date arithmetic: CURRENT_DATE, INTERVAL '1 month'
-   - String matching: ILIKE for case-insensitive
-   - Type casting: ::integer, ::date
-   - Array operations when appropriate
-
-4. **Performance Considerations**
-   - Avoid SELECT * when specific columns suffice
-   - Use indexes (mentioned in schema) wisely
-   - Prefer JOINs over subqueries when possible
-   - Use LIMIT for large result sets
-
-5. **Common Patterns**
-   - Aggregations: COUNT(*), SUM(), AVG(), MAX(), MIN()
-   - Time filters: WHERE created_at >= CURRENT_DATE - INTERVAL '30 days'
-   - String search: WHERE name ILIKE '%keyword%'
-   - Top N: ORDER BY column DESC LIMIT N
-   - Grouping: GROUP BY x, y HAVING COUNT(*) > n
-
-**Output Format:**
-Return ONLY the SQL query. No explanations, no markdown, no comments.
-
-**Example:**
-Question: "Show top 10 customers by total spending"
-Response: SELECT c.customer_id, c.first_name, c.last_name, SUM(o.total_amount) AS total_spending FROM customers c JOIN orders o ON c.customer_id = o.customer_id GROUP BY c.customer_id, c.first_name, c.last_name ORDER BY total_spending DESC LIMIT 10
-
-**When Uncertain:**
-If the schema context doesn't contain enough information, respond with:
-"CLARIFICATION NEEDED: [specific question about schema]"
-
-Now, generate the SQL query based on the user's question and the provided schema context.
-""".strip()
-
 
 async def build_agent():
     """
@@ -103,12 +44,33 @@ async def build_agent():
     )
 
     logger.info("✓ NL2SQL Agent created successfully")
+    logger.info("  System prompt: %d tokens (pre-encoded)", len(SYSTEM_PROMPT_TOKENS))
     logger.info("=" * 70)
     logger.info("")
 
     return agent
 
 
+# Process-wide agent singleton: building the agent wires middleware, the
+# store, and the system prompt, none of which change between questions
+_AGENT = None
+_agent_lock = asyncio.Lock()
+
+
+async def get_agent():
+    """Return the shared agent, building it once on first use
+
+    The lock makes concurrent first callers wait for a single build
+    instead of racing to construct duplicates.
+    """
+    global _AGENT
+    if _AGENT is None:
+        async with _agent_lock:
+            if _AGENT is None:
+                _AGENT = await build_agent()
+    return _AGENT
+
+
 async def generate_sql(question: str) -> dict:
     """
     Generate SQL query from natural language question.
@@ -119,55 +81,64 @@ async def generate_sql(question: str) -> dict:
     Returns:
         Dict with sql_query and metadata
     """
-    logger.info("")
-    logger.info("=" * 70)
-    logger.info(f"GENERATING SQL FOR: {question}")
-    logger.info("=" * 70)
+    logger.info("GENERATING SQL FOR: %s", question)
 
     try:
-        # Build agent
-        agent = await build_agent()
+        # Reuse the shared agent - construction cost is paid once per process
+        agent = await get_agent()
 
         # Invoke agent
         response = await agent.ainvoke(
             {"messages": [{"role": "user", "content": question}]}
         )
 
-        # Extract SQL from response
+        # Extract SQL: the agent appends its final AIMessage last, so the
+        # answer is almost always messages[-1]; the generator fallback only
+        # scans further when trailing messages are empty
         messages = response.get("messages", [])
-        sql_query = ""
-
-        # Get the last AI message
-        for msg in reversed(messages):
-            if hasattr(msg, 'content') and msg.content:
-                sql_query = msg.content
-                break
-
-        logger.info("")
-        logger.info("=" * 70)
-        logger.info("SQL GENERATION COMPLETED")
-        logger.info("=" * 70)
-        logger.info(f"Generated SQL:")
-        logger.info(sql_query)
-        logger.info("=" * 70)
-        logger.info("")
+        sql_query = next(
+            (msg.content for msg in reversed(messages)
+             if getattr(msg, 'content', None)),
+            ""
+        )
+
+        logger.info("SQL generation completed")
+        logger.debug("Generated SQL: %s", sql_query)
 
+        # Return only the SQL - handing back the full message history and
+        # response dict kept the entire conversation alive in every caller
+        # even though they only read sql_query
         return {
-            "sql_query": sql_query.strip(),
-            "messages": messages,
-            "full_response": response
+            "sql_query": sql_query.strip()
         }
 
     except Exception as e:
-        logger.error("")
-        logger.error("=" * 70)
-        logger.error(f"❌ SQL GENERATION FAILED: {type(e).__name__}")
-        logger.error(f"   {str(e)}")
-        logger.error("=" * 70)
+        logger.error("SQL generation failed: %s: %s", type(e).__name__, e)
         logger.exception("Full traceback:")
         raise
 
 
+async def stream_sql(question: str):
+    """
+    Stream SQL generation token-by-token as an async generator.
+
+    generate_sql waits for the full completion, so its time-to-first-
+    token equals total decode time. This sibling drives agent.astream in
+    messages mode and yields each token's text as it arrives, letting an
+    API layer forward chunks through a StreamingResponse while the model
+    is still decoding.
+    """
+    agent = await get_agent()
+
+    async for token, _metadata in agent.astream(
+        {"messages": [{"role": "user", "content": question}]},
+        stream_mode="messages",
+    ):
+        content = getattr(token, "content", None)
+        if content:
+            yield content
+
+
 # Example usage
 if __name__ == "__main__":
     import asyncio
@@ -180,13 +151,21 @@ if __name__ == "__main__":
             "Find customers who ordered Electronics products last month",
         ]
 
-        for question in questions:
+        # Run the questions concurrently - the embedding and LLM calls are
+        # independent network waits, so they overlap instead of serializing.
+        # The semaphore keeps us under OpenAI/Pinecone rate limits.
+        semaphore = asyncio.Semaphore(8)
+
+        async def run(question):
+            async with semaphore:
+                return await generate_sql(question)
+
+        results = await asyncio.gather(*(run(q) for q in questions))
+
+        for question, result in zip(questions, results):
             print(f"\n{'='*70}")
             print(f"Question: {question}")
             print('='*70)
-
-            result = await generate_sql(question)
-
             print(f"\nGenerated SQL:")
             print(result['sql_query'])
             print("=" * 70)
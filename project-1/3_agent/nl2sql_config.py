@@ -5,18 +5,92 @@ Provides shared instances of LLM and Store (following the pattern from your exam
 
 import os
 import logging
+import tiktoken
 from langchain_openai import ChatOpenAI, OpenAIEmbeddings
 from pinecone_store import PineconeStore
 
-logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
-# Initialize LLM
+# Initialize LLM. gpt-4o matches the API layer and supports server-side
+# prompt caching, though caching only kicks in at a 1024-token prefix -
+# SYSTEM_PROMPT alone sits well below that, so no prompt_cache_key is
+# set; the schema context appended per request varies anyway.
 llm = ChatOpenAI(
-    model="gpt-4",
+    model="gpt-4o",
     temperature=0
 )
 
+# System prompt for SQL generation. Defined once here - the agent and
+# middleware previously carried separate, slightly diverging copies, and
+# with two active definitions the build could silently flip between them
+# depending on import order, defeating the server-side prompt cache. The
+# prompt is sent byte-identically at message index 0 on every request.
+SYSTEM_PROMPT = """You are an expert PostgreSQL query generator for an e-commerce database.
+
+**Your Task:**
+Convert natural language questions into accurate, executable SQL queries.
+
+**Database Schema:**
+You will receive detailed schema information including:
+• Table definitions and purposes
+• Column names, data types, and constraints
+• Foreign key relationships and join patterns
+• Real-world query examples and patterns
+
+**SQL Generation Rules:**
+
+1. **Accuracy First**
+   - Use exact table and column names from the schema
+   - Respect data types and constraints
+   - Include all necessary JOINs
+
+2. **Query Structure**
+   - Start with SELECT for retrieval queries
+   - Use WHERE for filtering conditions
+   - Apply JOINs for multi-table queries
+   - Add GROUP BY for aggregations
+   - Include ORDER BY for sorting
+   - Use LIMIT for pagination
+
+3. **PostgreSQL Syntax**
+   - Use PostgreSQL-specific functions when needed
+   - Date arithmetic: CURRENT_DATE, INTERVAL '1 month'
+   - String matching: ILIKE for case-insensitive
+   - Type casting: ::integer, ::date
+   - Array operations when appropriate
+
+4. **Performance Considerations**
+   - Avoid SELECT * when specific columns suffice
+   - Use indexes (mentioned in schema) wisely
+   - Prefer JOINs over subqueries when possible
+   - Use LIMIT for large result sets
+
+5. **Common Patterns**
+   - Aggregations: COUNT(*), SUM(), AVG(), MAX(), MIN()
+   - Time filters: WHERE created_at >= CURRENT_DATE - INTERVAL '30 days'
+   - String search: WHERE name ILIKE '%keyword%'
+   - Top N: ORDER BY column DESC LIMIT N
+   - Grouping: GROUP BY x, y HAVING COUNT(*) > n
+
+**Output Format:**
+Return ONLY the SQL query. No explanations, no markdown, no comments.
+
+**Example:**
+Question: "Show top 10 customers by total spending"
+Response: SELECT c.customer_id, c.first_name, c.last_name, SUM(o.total_amount) AS total_spending FROM customers c JOIN orders o ON c.customer_id = o.customer_id GROUP BY c.customer_id, c.first_name, c.last_name ORDER BY total_spending DESC LIMIT 10
+
+**When Uncertain:**
+If the schema context doesn't contain enough information, respond with:
+"CLARIFICATION NEEDED: [specific question about schema]"
+
+Now, generate the SQL query based on the user's question and the provided schema context.
+""".strip()
+
+# Pre-tokenized once at import: the token ids give an exact prompt-size
+# figure for telemetry/budgeting without re-encoding per agent build
+_ENCODING = tiktoken.encoding_for_model("gpt-4o")
+SYSTEM_PROMPT_TOKENS = _ENCODING.encode(SYSTEM_PROMPT)
+
 # Initialize embeddings
 embeddings = OpenAIEmbeddings(
     model='text-embedding-3-small'
@@ -31,7 +105,8 @@ store = PineconeStore(
 logger.info("=" * 70)
 logger.info("NL2SQL Configuration Initialized")
 logger.info("=" * 70)
-logger.info(f"  LLM Model: gpt-4")
+logger.info(f"  LLM Model: gpt-4o")
+logger.info(f"  System prompt: {len(SYSTEM_PROMPT_TOKENS)} tokens")
 logger.info(f"  Embedding Model: text-embedding-3-small")
 logger.info(f"  Pinecone Index: nl2sql-semantic-memory")
 logger.info("=" * 70)
\ No newline at end of file
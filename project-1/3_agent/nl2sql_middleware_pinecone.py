@@ -5,91 +5,143 @@ Optimized Semantic Recall Middleware for NL2SQL
 - Enhanced system prompt
 """
 
+import hashlib
 import json
+import time
+from collections import OrderedDict
 from typing import Dict, Any, Optional
 
+
 from langchain.agents.middleware import AgentMiddleware, hook_config
 from langchain_core.messages import SystemMessage, AIMessage, HumanMessage
 import logging
 
-# Configure logging with more detail
-logging.basicConfig(
-    level=logging.INFO,
-    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
-)
+# Single canonical system prompt - a second diverging copy here used to
+# flip the effective prompt by import order and break prompt caching
+from nl2sql_config import SYSTEM_PROMPT as ENHANCED_SYSTEM_PROMPT
+
 logger = logging.getLogger(__name__)
 
 
+
+
+# The latest HumanMessage is virtually always within the last few
+# entries; bounding the first scan keeps the helper O(1) as session
+# histories grow into the hundreds of messages
+_TAIL_SCAN = 8
+
+
 def _extract_latest_human_message(messages: list) -> Optional[str]:
     """Extract content from the most recent HumanMessage."""
-    for msg in reversed(messages):
-        if isinstance(msg, HumanMessage):
+    # Exact-class check first: messages are concrete HumanMessage in
+    # practice, and `__class__ is` skips isinstance's mro walk; the
+    # isinstance fallback still honours subclasses
+    for msg in reversed(messages[-_TAIL_SCAN:]):
+        if msg.__class__ is HumanMessage or isinstance(msg, HumanMessage):
+            return msg.content
+    # Degenerate histories (long tool/AI runs): fall back to a full scan
+    for msg in reversed(messages[:-_TAIL_SCAN]):
+        if msg.__class__ is HumanMessage or isinstance(msg, HumanMessage):
             return msg.content
     return None
 
 
-def _format_retrieved_context(semantic_hits, procedural_hits) -> str:
-    """Format retrieved context with clear structure for logging and LLM"""
+# Section headers and the per-hit separator for the context builder,
+# built once at import instead of per call
+_H_TABLES = "=== AVAILABLE TABLES ==="
+_H_COLUMNS = "\n=== TABLE COLUMNS ==="
+_H_RELATIONSHIPS = "\n=== TABLE RELATIONSHIPS ==="
+_H_EXAMPLES = "\n=== QUERY EXAMPLES ==="
+_SEPARATOR = "-" * 50
 
-    parts = []
+# Character budget for the injected schema context. Hits arrive in
+# relevance order, so when the budget runs out the dropped tail is the
+# least relevant - and LLM prompt cost scales with tokens, not with the
+# per-section hit caps.
+MAX_CTX_CHARS = 8000
+
+
+
+# Assembled-context memo: agent retry loops re-ask identical questions
+# within seconds, and an unchanged store plus the same query always
+# yields the same context - so retrieval and formatting can both be
+# skipped. Keys carry the store's write version, so any upsert or
+# delete invalidates every memoized context at once.
+_CTX_CACHE: "OrderedDict[tuple, tuple]" = OrderedDict()
+_CTX_CACHE_MAX = 256
+_CTX_CACHE_TTL = 120
 
-    # Group semantic hits by type
-    tables = []
-    columns = []
-    relationships = []
 
+def _ctx_cache_get(key):
+    """Return a fresh memoized context for key, or None"""
+    entry = _CTX_CACHE.get(key)
+    if entry is None:
+        return None
+    ts, context = entry
+    if time.time() - ts > _CTX_CACHE_TTL:
+        del _CTX_CACHE[key]
+        return None
+    _CTX_CACHE.move_to_end(key)
+    return context
+
+
+def _ctx_cache_put(key, context):
+    """Memoize context under key, evicting the oldest at capacity"""
+    _CTX_CACHE[key] = (time.time(), context)
+    if len(_CTX_CACHE) > _CTX_CACHE_MAX:
+        _CTX_CACHE.popitem(last=False)
+
+
+def _bucket_hits(semantic_hits) -> Dict[str, list]:
+    """Partition semantic hits by entity type in one pass.
+
+    Shared by the context builder and the summary logging, so the hit
+    list is walked once per turn instead of once per consumer.
+    """
+    buckets = {"table": [], "column": [], "relationship": []}
     for hit in semantic_hits:
-        entity_type = hit.value.get('entity_type', 'unknown')
-        if entity_type == 'table':
-            tables.append(hit)
-        elif entity_type == 'column':
-            columns.append(hit)
-        elif entity_type == 'relationship':
-            relationships.append(hit)
-
-    # Format tables
-    if tables:
-        parts.append("=== AVAILABLE TABLES ===")
-        for hit in tables:
-            table_name = hit.value.get('table_name', 'unknown')
-            text = hit.value.get('text', '')
-            score = hit.score
-            parts.append(f"\nTable: {table_name} (relevance: {score:.3f})")
-            parts.append(text)
-            parts.append("-" * 50)
-
-    # Format columns
-    if columns:
-        parts.append("\n=== TABLE COLUMNS ===")
-        for hit in columns:
-            table_name = hit.value.get('table_name', 'unknown')
-            column_name = hit.value.get('column_name', 'unknown')
-            text = hit.value.get('text', '')
-            score = hit.score
-            parts.append(f"\n{table_name}.{column_name} (relevance: {score:.3f})")
-            parts.append(text)
-            parts.append("-" * 50)
-
-    # Format relationships
-    if relationships:
-        parts.append("\n=== TABLE RELATIONSHIPS ===")
-        for hit in relationships:
-            text = hit.value.get('text', '')
-            score = hit.score
-            parts.append(f"\nRelationship (relevance: {score:.3f})")
-            parts.append(text)
-            parts.append("-" * 50)
-
-    # Format query examples
-    if procedural_hits:
-        parts.append("\n=== QUERY EXAMPLES ===")
-        for hit in procedural_hits:
-            table_name = hit.value.get('table_name', 'unknown')
+        bucket = buckets.get(hit.value.get('entity_type'))
+        if bucket is not None:
+            bucket.append(hit)
+    return buckets
+
+
+def _format_retrieved_context(buckets, procedural_hits) -> str:
+    """Format retrieved context with clear structure for logging and LLM"""
+
+    parts = []
+    total = 0
+
+    def add_section(header, hits, describe):
+        nonlocal total
+        if not hits or total >= MAX_CTX_CHARS:
+            return
+        append = parts.append  # bind once for the loop
+        append(header)
+        for hit in hits:
+            if total >= MAX_CTX_CHARS:
+                break
             text = hit.value.get('text', '')
-            score = hit.score
-            parts.append(f"\nExample for {table_name} (relevance: {score:.3f})")
-            parts.append(text)
-            parts.append("-" * 50)
+            if not text:
+                # Empty chunks would contribute only header/separator noise
+                continue
+            # Label, text and separator fused into one list entry: a
+            # single append and one temporary instead of three each
+            append(f"{describe(hit)}\n{text}\n{_SEPARATOR}")
+            total += len(text) + 60
+
+    add_section(
+        _H_TABLES, buckets["table"],
+        lambda h: f"\nTable: {h.value.get('table_name', 'unknown')} (relevance: {h.score:.3f})")
+    add_section(
+        _H_COLUMNS, buckets["column"],
+        lambda h: f"\n{h.value.get('table_name', 'unknown')}.{h.value.get('column_name', 'unknown')} (relevance: {h.score:.3f})")
+    add_section(
+        _H_RELATIONSHIPS, buckets["relationship"],
+        lambda h: f"\nRelationship (relevance: {h.score:.3f})")
+    add_section(
+        _H_EXAMPLES, procedural_hits,
+        lambda h: f"\nExample for {h.value.get('table_name', 'unknown')} (relevance: {h.score:.3f})")
 
     return "\n".join(parts)
 
@@ -123,197 +175,98 @@ class OptimizedNL2SQLMiddleware(AgentMiddleware):
         Retrieve relevant schema context before agent execution.
         This is the ONLY hook - before_model removed to avoid redundancy.
         """
-        logger.info("")
-        logger.info("=" * 70)
-        logger.info("BEFORE_AGENT: Starting semantic recall")
-        logger.info("=" * 70)
-
         try:
             messages = state.get("messages", [])
             query = _extract_latest_human_message(messages)
 
             if not query:
-                logger.warning("⚠️  No HumanMessage found - skipping semantic recall")
+                logger.warning("No HumanMessage found - skipping semantic recall")
                 return None
 
-            logger.info(f"📝 User Query: {query}")
-            logger.info("")
-
-            # === SEMANTIC MEMORY SEARCH ===
-            logger.info(f"🔍 Searching semantic memory (limit={self.semantic_limit})...")
-            semantic_hits = self.store.search(
-                ("semantic",),
-                query=query,
-                limit=self.semantic_limit
+            logger.debug("Semantic recall for: %s", query)
+
+            cache_key = (getattr(self.store, "version", 0),
+                         hashlib.sha1(query.encode()).hexdigest())
+            context = _ctx_cache_get(cache_key)
+            if context is not None:
+                logger.debug("Schema context served from memo")
+                return {
+                    "messages": [
+                        SystemMessage(content=f"Database schema context:\n\n{context}")
+                    ]
+                }
+
+            semantic_limit = self.semantic_limit
+            procedural_limit = self.procedural_limit
+            score_threshold = self.score_threshold
+
+            # === MEMORY SEARCH (one combined Pinecone query) ===
+            # Both namespaces share the index, so one embed + one query
+            # serves both partitions - no second round-trip at all
+            # The threshold rides along so the store can stop converting
+            # matches as soon as scores drop below it
+            semantic_hits, procedural_hits = self.store.search_pair(
+                query,
+                semantic_limit=semantic_limit,
+                procedural_limit=procedural_limit,
+                score_threshold=score_threshold,
             )
-            logger.info(f" Retrieved {len(semantic_hits)},{semantic_hits} semantic chunks")
 
-            # Log top semantic results
-            if semantic_hits:
-                logger.info("   Top 5 semantic results:")
+            # Per-hit introspection allocates; only walk the hits when
+            # DEBUG output will actually be emitted
+            if logger.isEnabledFor(logging.DEBUG):
                 for i, hit in enumerate(semantic_hits[:5], 1):
-                    entity_type = hit.value.get('entity_type', 'unknown')
-                    table_name = hit.value.get('table_name', 'unknown')
-                    column_name = hit.value.get('column_name', '')
-                    score = hit.score
-
-                    if column_name:
-                        logger.info(f"     {i}. [{entity_type}] {table_name}.{column_name} (score: {score:.3f})")
-                    else:
-                        logger.info(f"     {i}. [{entity_type}] {table_name} (score: {score:.3f})")
-
-            # === PROCEDURAL MEMORY SEARCH ===
-            logger.info("")
-            logger.info(f"🔍 Searching procedural memory (limit={self.procedural_limit})...")
-            procedural_hits = self.store.search(
-                ("procedural",),
-                query=query,
-                limit=self.procedural_limit
-            )
-            logger.info(f"   Retrieved {len(procedural_hits)} procedural chunks")
-
-            # Log top procedural results
-            if procedural_hits:
-                logger.info("   Top 3 procedural results:")
+                    logger.debug(
+                        "  semantic %d. [%s] %s.%s (score: %.3f)", i,
+                        hit.value.get('entity_type', 'unknown'),
+                        hit.value.get('table_name', 'unknown'),
+                        hit.value.get('column_name', ''), hit.score)
                 for i, hit in enumerate(procedural_hits[:3], 1):
-                    table_name = hit.value.get('table_name', 'unknown')
-                    score = hit.score
-                    use_case = hit.value.get('text', '')[:80]
-                    logger.info(f"     {i}. {table_name} (score: {score:.3f})")
-                    logger.info(f"        {use_case}...")
-
-            # === FILTERING BY SCORE ===
-            logger.info("")
-            logger.info(f"🎯 Filtering by score threshold: {self.score_threshold}")
+                    logger.debug(
+                        "  procedural %d. %s (score: %.3f) %s", i,
+                        hit.value.get('table_name', 'unknown'), hit.score,
+                        hit.value.get('text', '')[:80])
 
-            semantic_filtered = [hit for hit in semantic_hits if hit.score >= self.score_threshold]
-            procedural_filtered = [hit for hit in procedural_hits if hit.score >= self.score_threshold]
-
-            logger.info(f"   Semantic: {len(semantic_hits)} → {len(semantic_filtered)} (after filtering)")
-            logger.info(f"   Procedural: {len(procedural_hits)} → {len(procedural_filtered)} (after filtering)")
+            # Hits arrive pre-filtered by the store's threshold pushdown
+            semantic_filtered = semantic_hits
+            procedural_filtered = procedural_hits
 
             total_hits = len(semantic_filtered) + len(procedural_filtered)
-            logger.info(f"   Total relevant chunks: {total_hits}")
+            logger.info(
+                "Semantic recall: %d semantic, %d procedural above %.2f",
+                len(semantic_filtered), len(procedural_filtered),
+                score_threshold)
 
-            # === BUILD CONTEXT ===
             if total_hits > 0:
-                logger.info("")
-                logger.info("📦 Building context for LLM...")
-
-                context = _format_retrieved_context(semantic_filtered, procedural_filtered)
-
-                logger.info(f"   Context length: {len(context)} characters")
-                logger.info(f"   Context contains:")
-
-                # Count entity types
-                tables = sum(1 for h in semantic_filtered if h.value.get('entity_type') == 'table')
-                columns = sum(1 for h in semantic_filtered if h.value.get('entity_type') == 'column')
-                relationships = sum(1 for h in semantic_filtered if h.value.get('entity_type') == 'relationship')
-
-                logger.info(f"     - {tables} tables")
-                logger.info(f"     - {columns} columns")
-                logger.info(f"     - {relationships} relationships")
-                logger.info(f"     - {len(procedural_filtered)} query examples")
-
-                # === INJECT CONTEXT ===
-                logger.info("")
-                logger.info("💉 Injecting context into agent state...")
-
-                state["messages"].append(
-                    SystemMessage(content=f"Database schema context:\n\n{context}")
-                )
-
-                logger.info("   ✓ Context injected as SystemMessage")
-                logger.info(f"   Total messages in state: {len(state['messages'])}")
-
-                # Log sample of context (first 500 chars)
-                logger.info("")
-                logger.info("📄 Context preview (first 500 chars):")
-                logger.info("-" * 70)
-                logger.info(context[:500] + "...")
-                logger.info("-" * 70)
-
-            else:
-                logger.warning("")
-                logger.warning("⚠️  No relevant context found (all scores below threshold)")
-                logger.warning("   Agent will proceed without schema context")
-
-            logger.info("")
-            logger.info("✓ Semantic recall completed - continuing with agent")
-            logger.info("=" * 70)
-            logger.info("")
-
+                buckets = _bucket_hits(semantic_filtered)
+                context = _format_retrieved_context(buckets, procedural_filtered)
+                _ctx_cache_put(cache_key, context)
+
+                if logger.isEnabledFor(logging.DEBUG):
+                    logger.debug(
+                        "Context: %d chars (%d tables, %d columns, "
+                        "%d relationships, %d examples); preview: %s",
+                        len(context), len(buckets['table']),
+                        len(buckets['column']), len(buckets['relationship']),
+                        len(procedural_filtered), context[:500])
+
+                # Return a state delta and let the messages reducer merge
+                # it in; appending to state["messages"] in place makes
+                # LangGraph re-serialize the whole growing history on
+                # every state update
+                return {
+                    "messages": [
+                        SystemMessage(content=f"Database schema context:\n\n{context}")
+                    ]
+                }
+
+            logger.warning(
+                "No relevant context found (all scores below threshold) - "
+                "agent will proceed without schema context")
             return None
 
         except Exception as e:
-            logger.error("")
-            logger.error("=" * 70)
-            logger.error(f"❌ ERROR in before_agent: {type(e).__name__}")
-            logger.error(f"   {str(e)}")
-            logger.error("=" * 70)
+            logger.error("before_agent failed: %s: %s", type(e).__name__, e)
             logger.exception("Full traceback:")
             logger.warning("Continuing with agent execution (without context)")
             return None
-
-
-# Enhanced system prompt
-ENHANCED_SYSTEM_PROMPT = """You are an expert PostgreSQL query generator for an e-commerce database.
-
-**Your Task:**
-Convert natural language questions into accurate, executable SQL queries.
-
-**Database Schema:**
-You will receive detailed schema information including:
-• Table definitions and purposes
-• Column names, data types, and constraints
-• Foreign key relationships and join patterns
-• Real-world query examples and patterns
-
-**SQL Generation Rules:**
-
-1. **Accuracy First**
-   - Use exact table and column names from the schema
-   - Respect data types and constraints
-   - Include all necessary JOINs
-
-2. **Query Structure**
-   - Start with SELECT for retrieval queries
-   - Use WHERE for filtering conditions
-   - Apply JOINs for multi-table queries
-   - Add GROUP BY for aggregations
-   - Include ORDER BY for sorting
-   - Use LIMIT for pagination
-
-3. **PostgreSQL Syntax**
-   - Use PostgreSQL-specific functions when needed
-   - Date arithmetic: CURRENT_DATE, INTERVAL '1 month'
-   - String matching: ILIKE for case-insensitive
-   - Type casting: ::integer, ::date
-   - Array operations when appropriate
-
-4. **Performance Considerations**
-   - Avoid SELECT * when specific columns suffice
-   - Use indexes (mentioned in schema) wisely
-   - Prefer JOINs over subqueries when possible
-   - Use LIMIT for large result sets
-
-5. **Common Patterns**
-   - Aggregations: COUNT(*), SUM(), AVG(), MAX(), MIN()
-   - Time filters: WHERE created_at >= CURRENT_DATE - INTERVAL '30 days'
-   - String search: WHERE name ILIKE '%keyword%'
-   - Top N: ORDER BY column DESC LIMIT N
-   - Grouping: GROUP BY x, y HAVING COUNT(*) > n
-
-**Output Format:**
-Return ONLY the SQL query. No explanations, no markdown, no comments.
-
-**Example:**
-Question: "Show top 10 customers by total spending"
-Response: SELECT c.customer_id, c.first_name, c.last_name, SUM(o.total_amount) AS total_spending FROM customers c JOIN orders o ON c.customer_id = o.customer_id GROUP BY c.customer_id, c.first_name, c.last_name ORDER BY total_spending DESC LIMIT 10
-
-**When Uncertain:**
-If the schema context doesn't contain enough information, respond with:
-"CLARIFICATION NEEDED: [specific question about schema]"
-
-Now, generate the SQL query based on the user's question and the provided schema context.
-""".strip()
\ No newline at end of file
@@ -3,89 +3,149 @@ Semantic Recall Middleware for NL2SQL
 Imports store from config module (does NOT take store as parameter)
 """
 
+import hashlib
 import json
+import time
+from collections import OrderedDict
 from typing import Dict, Any, Optional
 import logging
 
+
 from langchain.agents.middleware import AgentMiddleware, hook_config
 from langchain_core.messages import SystemMessage, AIMessage, HumanMessage
 from nl2sql_config import store  # Import store from config
 
-logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
 
+
+
+# Retrieval configuration, fixed for this middleware; module-level
+# constants rather than per-call locals so the numbers are visible and
+# tweakable in one place
+SEMANTIC_LIMIT = 25
+PROCEDURAL_LIMIT = 10
+SCORE_THRESHOLD = 0.65
+
+
+# The latest HumanMessage is virtually always within the last few
+# entries; bounding the first scan keeps the helper O(1) as session
+# histories grow into the hundreds of messages
+_TAIL_SCAN = 8
+
+
 def _extract_latest_human_message(messages: list) -> Optional[str]:
     """Extract content from the most recent HumanMessage."""
-    for msg in reversed(messages):
-        if isinstance(msg, HumanMessage):
+    # Exact-class check first: messages are concrete HumanMessage in
+    # practice, and `__class__ is` skips isinstance's mro walk; the
+    # isinstance fallback still honours subclasses
+    for msg in reversed(messages[-_TAIL_SCAN:]):
+        if msg.__class__ is HumanMessage or isinstance(msg, HumanMessage):
+            return msg.content
+    # Degenerate histories (long tool/AI runs): fall back to a full scan
+    for msg in reversed(messages[:-_TAIL_SCAN]):
+        if msg.__class__ is HumanMessage or isinstance(msg, HumanMessage):
             return msg.content
     return None
 
 
-def _format_retrieved_context(semantic_hits, procedural_hits) -> str:
+# Section headers and the per-hit separator for the context builder,
+# built once at import instead of per call
+_H_TABLES = "=== AVAILABLE TABLES ==="
+_H_COLUMNS = "\n=== TABLE COLUMNS ==="
+_H_RELATIONSHIPS = "\n=== TABLE RELATIONSHIPS ==="
+_H_EXAMPLES = "\n=== QUERY EXAMPLES ==="
+_SEPARATOR = "-" * 50
+
+# Character budget for the injected schema context. Hits arrive in
+# relevance order, so when the budget runs out the dropped tail is the
+# least relevant - and LLM prompt cost scales with tokens, not with the
+# per-section hit caps.
+MAX_CTX_CHARS = 8000
+
+
+
+# Assembled-context memo: agent retry loops re-ask identical questions
+# within seconds, and an unchanged store plus the same query always
+# yields the same context - so retrieval and formatting can both be
+# skipped. Keys carry the store's write version, so any upsert or
+# delete invalidates every memoized context at once.
+_CTX_CACHE: "OrderedDict[tuple, tuple]" = OrderedDict()
+_CTX_CACHE_MAX = 256
+_CTX_CACHE_TTL = 120
+
+
+def _ctx_cache_get(key):
+    """Return a fresh memoized context for key, or None"""
+    entry = _CTX_CACHE.get(key)
+    if entry is None:
+        return None
+    ts, context = entry
+    if time.time() - ts > _CTX_CACHE_TTL:
+        del _CTX_CACHE[key]
+        return None
+    _CTX_CACHE.move_to_end(key)
+    return context
+
+
+def _ctx_cache_put(key, context):
+    """Memoize context under key, evicting the oldest at capacity"""
+    _CTX_CACHE[key] = (time.time(), context)
+    if len(_CTX_CACHE) > _CTX_CACHE_MAX:
+        _CTX_CACHE.popitem(last=False)
+
+
+def _bucket_hits(semantic_hits) -> Dict[str, list]:
+    """Partition semantic hits by entity type in one pass.
+
+    Shared by the context builder and the summary logging, so the hit
+    list is walked once per turn instead of once per consumer.
+    """
+    buckets = {"table": [], "column": [], "relationship": []}
+    for hit in semantic_hits:
+        bucket = buckets.get(hit.value.get('entity_type'))
+        if bucket is not None:
+            bucket.append(hit)
+    return buckets
+
+
+def _format_retrieved_context(buckets, procedural_hits) -> str:
     """Format retrieved context with clear structure"""
-    
+
     parts = []
-    
-    # Group semantic hits by type
-    tables = []
-    columns = []
-    relationships = []
-    
-    for hit in semantic_hits:
-        entity_type = hit.value.get('entity_type', 'unknown')
-        if entity_type == 'table':
-            tables.append(hit)
-        elif entity_type == 'column':
-            columns.append(hit)
-        elif entity_type == 'relationship':
-            relationships.append(hit)
-    
-    # Format tables
-    if tables:
-        parts.append("=== AVAILABLE TABLES ===")
-        for hit in tables:
-            table_name = hit.value.get('table_name', 'unknown')
-            text = hit.value.get('text', '')
-            score = hit.score
-            parts.append(f"\nTable: {table_name} (relevance: {score:.3f})")
-            parts.append(text)
-            parts.append("-" * 50)
-    
-    # Format columns
-    if columns:
-        parts.append("\n=== TABLE COLUMNS ===")
-        for hit in columns:
-            table_name = hit.value.get('table_name', 'unknown')
-            column_name = hit.value.get('column_name', 'unknown')
-            text = hit.value.get('text', '')
-            score = hit.score
-            parts.append(f"\n{table_name}.{column_name} (relevance: {score:.3f})")
-            parts.append(text)
-            parts.append("-" * 50)
-    
-    # Format relationships
-    if relationships:
-        parts.append("\n=== TABLE RELATIONSHIPS ===")
-        for hit in relationships:
-            text = hit.value.get('text', '')
-            score = hit.score
-            parts.append(f"\nRelationship (relevance: {score:.3f})")
-            parts.append(text)
-            parts.append("-" * 50)
-    
-    # Format query examples
-    if procedural_hits:
-        parts.append("\n=== QUERY EXAMPLES ===")
-        for hit in procedural_hits:
-            table_name = hit.value.get('table_name', 'unknown')
+    total = 0
+
+    def add_section(header, hits, describe):
+        nonlocal total
+        if not hits or total >= MAX_CTX_CHARS:
+            return
+        append = parts.append  # bind once for the loop
+        append(header)
+        for hit in hits:
+            if total >= MAX_CTX_CHARS:
+                break
             text = hit.value.get('text', '')
-            score = hit.score
-            parts.append(f"\nExample for {table_name} (relevance: {score:.3f})")
-            parts.append(text)
-            parts.append("-" * 50)
-    
+            if not text:
+                # Empty chunks would contribute only header/separator noise
+                continue
+            # Label, text and separator fused into one list entry: a
+            # single append and one temporary instead of three each
+            append(f"{describe(hit)}\n{text}\n{_SEPARATOR}")
+            total += len(text) + 60
+
+    add_section(
+        _H_TABLES, buckets["table"],
+        lambda h: f"\nTable: {h.value.get('table_name', 'unknown')} (relevance: {h.score:.3f})")
+    add_section(
+        _H_COLUMNS, buckets["column"],
+        lambda h: f"\n{h.value.get('table_name', 'unknown')}.{h.value.get('column_name', 'unknown')} (relevance: {h.score:.3f})")
+    add_section(
+        _H_RELATIONSHIPS, buckets["relationship"],
+        lambda h: f"\nRelationship (relevance: {h.score:.3f})")
+    add_section(
+        _H_EXAMPLES, procedural_hits,
+        lambda h: f"\nExample for {h.value.get('table_name', 'unknown')} (relevance: {h.score:.3f})")
+
     return "\n".join(parts)
 
 
@@ -108,139 +168,99 @@ class NL2SQLSemanticRecallMiddleware(AgentMiddleware):
         """
         Retrieve relevant schema context before agent execution.
         """
-        logger.info("")
-        logger.info("=" * 70)
-        logger.info("BEFORE_AGENT: Starting semantic recall")
-        logger.info("=" * 70)
-
         try:
             messages = state.get("messages", [])
             query = _extract_latest_human_message(messages)
 
             if not query:
-                logger.warning("⚠️  No HumanMessage found - skipping semantic recall")
+                logger.warning("No HumanMessage found - skipping semantic recall")
                 return None
 
-            logger.info(f"📝 User Query: {query}")
-            logger.info("")
-            
+            logger.debug("Semantic recall for: %s", query)
+
+            cache_key = (getattr(store, "version", 0),
+                         hashlib.sha1(query.encode()).hexdigest())
+            context = _ctx_cache_get(cache_key)
+            if context is not None:
+                logger.debug("Schema context served from memo")
+                return {
+                    "messages": [
+                        SystemMessage(content=f"Database schema context:\n\n{context}")
+                    ]
+                }
+
             # Configuration
-            semantic_limit = 25
-            procedural_limit = 10
-            score_threshold = 0.65
-            
-            # === SEMANTIC MEMORY SEARCH ===
-            logger.info(f"🔍 Searching semantic memory (limit={semantic_limit})...")
-            semantic_hits = store.search(
-                ("semantic",),  # namespace as positional arg
-                query=query,
-                limit=semantic_limit
+            semantic_limit = SEMANTIC_LIMIT
+            procedural_limit = PROCEDURAL_LIMIT
+            score_threshold = SCORE_THRESHOLD
+
+            # === MEMORY SEARCH (one combined Pinecone query) ===
+            # Both namespaces share the index, so one embed + one query
+            # serves both partitions - no second round-trip at all
+            # The threshold rides along so the store can stop converting
+            # matches as soon as scores drop below it
+            semantic_hits, procedural_hits = store.search_pair(
+                query,
+                semantic_limit=semantic_limit,
+                procedural_limit=procedural_limit,
+                score_threshold=score_threshold,
             )
-            logger.info(f"   Retrieved {len(semantic_hits)} semantic chunks")
-            
-            # Log top semantic results
-            if semantic_hits:
-                logger.info("   Top 5 semantic results:")
+
+            # Per-hit introspection allocates; only walk the hits when
+            # DEBUG output will actually be emitted
+            if logger.isEnabledFor(logging.DEBUG):
                 for i, hit in enumerate(semantic_hits[:5], 1):
-                    entity_type = hit.value.get('entity_type', 'unknown')
-                    table_name = hit.value.get('table_name', 'unknown')
-                    column_name = hit.value.get('column_name', '')
-                    score = hit.score
-                    
-                    if column_name:
-                        logger.info(f"     {i}. [{entity_type}] {table_name}.{column_name} (score: {score:.3f})")
-                    else:
-                        logger.info(f"     {i}. [{entity_type}] {table_name} (score: {score:.3f})")
-            
-            # === PROCEDURAL MEMORY SEARCH ===
-            logger.info("")
-            logger.info(f"🔍 Searching procedural memory (limit={procedural_limit})...")
-            procedural_hits = store.search(
-                ("procedural",),  # namespace as positional arg
-                query=query,
-                limit=procedural_limit
-            )
-            logger.info(f"   Retrieved {len(procedural_hits)} procedural chunks")
-            
-            # Log top procedural results
-            if procedural_hits:
-                logger.info("   Top 3 procedural results:")
+                    logger.debug(
+                        "  semantic %d. [%s] %s.%s (score: %.3f)", i,
+                        hit.value.get('entity_type', 'unknown'),
+                        hit.value.get('table_name', 'unknown'),
+                        hit.value.get('column_name', ''), hit.score)
                 for i, hit in enumerate(procedural_hits[:3], 1):
-                    table_name = hit.value.get('table_name', 'unknown')
-                    score = hit.score
-                    use_case = hit.value.get('text', '')[:80]
-                    logger.info(f"     {i}. {table_name} (score: {score:.3f})")
-                    logger.info(f"        {use_case}...")
-            
-            # === FILTERING BY SCORE ===
-            logger.info("")
-            logger.info(f"🎯 Filtering by score threshold: {score_threshold}")
-            
-            semantic_filtered = [hit for hit in semantic_hits if hit.score >= score_threshold]
-            procedural_filtered = [hit for hit in procedural_hits if hit.score >= score_threshold]
-            
-            logger.info(f"   Semantic: {len(semantic_hits)} → {len(semantic_filtered)} (after filtering)")
-            logger.info(f"   Procedural: {len(procedural_hits)} → {len(procedural_filtered)} (after filtering)")
-            
+                    logger.debug(
+                        "  procedural %d. %s (score: %.3f) %s", i,
+                        hit.value.get('table_name', 'unknown'), hit.score,
+                        hit.value.get('text', '')[:80])
+
+            # Hits arrive pre-filtered by the store's threshold pushdown
+            semantic_filtered = semantic_hits
+            procedural_filtered = procedural_hits
+
             total_hits = len(semantic_filtered) + len(procedural_filtered)
-            logger.info(f"   Total relevant chunks: {total_hits}")
-            
-            # === BUILD CONTEXT ===
+            logger.info(
+                "Semantic recall: %d semantic, %d procedural above %.2f",
+                len(semantic_filtered), len(procedural_filtered),
+                score_threshold)
+
             if total_hits > 0:
-                logger.info("")
-                logger.info("📦 Building context for LLM...")
-                
-                context = _format_retrieved_context(semantic_filtered, procedural_filtered)
-                
-                logger.info(f"   Context length: {len(context)} characters")
-                logger.info(f"   Context contains:")
-                
-                # Count entity types
-                tables = sum(1 for h in semantic_filtered if h.value.get('entity_type') == 'table')
-                columns = sum(1 for h in semantic_filtered if h.value.get('entity_type') == 'column')
-                relationships = sum(1 for h in semantic_filtered if h.value.get('entity_type') == 'relationship')
-                
-                logger.info(f"     - {tables} tables")
-                logger.info(f"     - {columns} columns")
-                logger.info(f"     - {relationships} relationships")
-                logger.info(f"     - {len(procedural_filtered)} query examples")
-                
-                # === INJECT CONTEXT ===
-                logger.info("")
-                logger.info("💉 Injecting context into agent state...")
-                
-                state["messages"].append(
-                    SystemMessage(content=f"Database schema context:\n\n{context}")
-                )
-                
-                logger.info("   ✓ Context injected as SystemMessage")
-                logger.info(f"   Total messages in state: {len(state['messages'])}")
-                
-                # Log sample of context (first 500 chars)
-                logger.info("")
-                logger.info("📄 Context preview (first 500 chars):")
-                logger.info("-" * 70)
-                logger.info(context[:500] + "...")
-                logger.info("-" * 70)
-                
-            else:
-                logger.warning("")
-                logger.warning("⚠️  No relevant context found (all scores below threshold)")
-                logger.warning("   Agent will proceed without schema context")
-            
-            logger.info("")
-            logger.info("✓ Semantic recall completed - continuing with agent")
-            logger.info("=" * 70)
-            logger.info("")
-            
+                buckets = _bucket_hits(semantic_filtered)
+                context = _format_retrieved_context(buckets, procedural_filtered)
+                _ctx_cache_put(cache_key, context)
+
+                if logger.isEnabledFor(logging.DEBUG):
+                    logger.debug(
+                        "Context: %d chars (%d tables, %d columns, "
+                        "%d relationships, %d examples); preview: %s",
+                        len(context), len(buckets['table']),
+                        len(buckets['column']), len(buckets['relationship']),
+                        len(procedural_filtered), context[:500])
+
+                # Return a state delta and let the messages reducer merge
+                # it in; appending to state["messages"] in place makes
+                # LangGraph re-serialize the whole growing history on
+                # every state update
+                return {
+                    "messages": [
+                        SystemMessage(content=f"Database schema context:\n\n{context}")
+                    ]
+                }
+
+            logger.warning(
+                "No relevant context found (all scores below threshold) - "
+                "agent will proceed without schema context")
             return None
 
         except Exception as e:
-            logger.error("")
-            logger.error("=" * 70)
-            logger.error(f"❌ ERROR in before_agent: {type(e).__name__}")
-            logger.error(f"   {str(e)}")
-            logger.error("=" * 70)
+            logger.error("before_agent failed: %s: %s", type(e).__name__, e)
             logger.exception("Full traceback:")
             logger.warning("Continuing with agent execution (without context)")
-            return None
\ No newline at end of file
+            return None
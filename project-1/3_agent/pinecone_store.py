@@ -4,8 +4,10 @@ Pinecone-backed Store implementation compatible with LangGraph BaseStore.
 
 from __future__ import annotations
 
+import functools
 import json
 import os
+import sys
 import logging
 import time
 import traceback
@@ -13,7 +15,13 @@ from typing import Any, Dict, List, Optional, Tuple
 from collections.abc import Iterable
 from datetime import datetime
 
+import numpy as np
 from pinecone import Pinecone
+
+try:
+    import orjson
+except ImportError:  # optional speedup; stdlib json covers the same calls
+    orjson = None
 from langgraph.store.base import (
     BaseStore,
     Item,
@@ -31,10 +39,106 @@ logger = logging.getLogger(__name__)
 
 _METADATA_SOFT_LIMIT = 40000  # Pinecone's metadata limit (40KB)
 
+# Category values repeated across thousands of vectors; interning makes
+# every put reference one canonical object instead of a fresh string
+_INTERNED = {s: sys.intern(s) for s in (
+    "table", "column", "relationship", "semantic", "procedural")}
+
+# Pair-search similarity cache: cosine threshold, entry lifetime, capacity
+_PAIRCACHE_THRESHOLD = 0.95
+_PAIRCACHE_TTL = 600
+_PAIRCACHE_MAX = 256
+
+
+class _PairSearchCache:
+    """Similarity cache over recent search_pair results.
+
+    search_pair is a pure function of the query embedding and index
+    state, so paraphrased questions whose embeddings clear the cosine
+    threshold can reuse the previous hits and skip the Pinecone
+    round-trip entirely. A NumPy matmul over at most a few hundred
+    normalized vectors decides the hit in microseconds.
+
+    Cached vectors are held int8-quantized (symmetric max-abs scale per
+    vector): 1.5 KB per entry instead of 6 KB, so the whole buffer stays
+    cache-resident during the scan. The quantization error (~1e-3 on the
+    similarity) is far inside the 0.95 threshold's margin.
+    """
+
+    def __init__(self, dimension: int = 1536, max_entries: int = _PAIRCACHE_MAX,
+                 threshold: float = _PAIRCACHE_THRESHOLD, ttl: int = _PAIRCACHE_TTL):
+        self.threshold = threshold
+        self.ttl = ttl
+        self.max_entries = max_entries
+        # Ring buffer: oldest entries are overwritten at capacity.
+        # int8 codes plus a per-vector dequantization scale reconstruct
+        # the dot product as (codes @ query) * scale.
+        self._vectors = np.zeros((max_entries, dimension), dtype=np.int8)
+        self._scales = np.zeros(max_entries, dtype=np.float32)
+        self._entries = [None] * max_entries
+        self._count = 0
+        self._pos = 0
+
+    @staticmethod
+    def _normalize(embedding) -> np.ndarray:
+        v = np.asarray(embedding, dtype=np.float32)
+        norm = np.linalg.norm(v)
+        return v / norm if norm else v
+
+    @staticmethod
+    def _quantize(v: np.ndarray):
+        """Symmetric scalar quantization: int8 codes + dequant scale"""
+        max_abs = float(np.abs(v).max())
+        if max_abs == 0.0:
+            return np.zeros(v.shape, dtype=np.int8), 0.0
+        codes = np.round(v * (127.0 / max_abs)).astype(np.int8)
+        return codes, max_abs / 127.0
+
+    def get(self, embedding, version: int = 0):
+        """Return cached (semantic, procedural) for a close, fresh query
+
+        `version` is the store's write counter at lookup time; entries
+        recorded under an older version predate an upsert or delete and
+        are rejected, so a write invalidates the whole cache at once
+        instead of serving up to TTL-stale hits.
+        """
+        if self._count == 0:
+            return None
+        # int8 @ float32 promotes inside the matmul; no float copy of
+        # the ring buffer is materialized
+        sims = self._vectors[:self._count] @ self._normalize(embedding)
+        sims *= self._scales[:self._count]
+        best = int(np.argmax(sims))
+        if sims[best] < self.threshold:
+            return None
+        ts, entry_version, results = self._entries[best]
+        if entry_version != version or time.time() - ts > self.ttl:
+            return None
+        return results
+
+    def put(self, embedding, results, version: int = 0):
+        """Store results for this query embedding under a store version"""
+        codes, scale = self._quantize(self._normalize(embedding))
+        self._vectors[self._pos] = codes
+        self._scales[self._pos] = scale
+        self._entries[self._pos] = (time.time(), version, results)
+        self._pos = (self._pos + 1) % self.max_entries
+        self._count = min(self._count + 1, self.max_entries)
+
+
+if orjson is not None:
+    _dumps = orjson.dumps
+else:
+    def _dumps(obj) -> bytes:
+        return json.dumps(obj, ensure_ascii=False).encode("utf-8")
+
 
 def _json_len_bytes(obj: dict) -> int:
     """Rough-but-safe UTF-8 size estimate"""
-    return len(json.dumps(obj, ensure_ascii=False).encode("utf-8"))
+    # orjson serializes straight to bytes - no intermediate str - and is
+    # several times faster, which matters when the truncation path sizes
+    # dicts carrying ~40 KB texts
+    return len(_dumps(obj))
 
 
 def _compact_metadata(value: dict, *, text: str | None) -> dict:
@@ -42,34 +146,87 @@ def _compact_metadata(value: dict, *, text: str | None) -> dict:
     Produce a metadata dict that respects Pinecone's 40KB metadata limit.
     For NL2SQL, we NEED full text in metadata for context injection.
     """
-    # Start with full metadata including text
+    entity_type = value.get("entity_type")
+    memory_type = value.get("memory_type", "semantic")
+    keywords = value.get("keywords")
+
+    # Start with full metadata including text. Keywords are deduped and
+    # sorted: canonical order shrinks the payload and makes equal keyword
+    # sets byte-identical across vectors.
     meta = {
         "table_name": value.get("table_name"),
-        "entity_type": value.get("entity_type"),
+        "entity_type": _INTERNED.get(entity_type, entity_type),
         "column_name": value.get("column_name"),
-        "keywords": value.get("keywords"),
-        "memory_type": value.get("memory_type", "semantic"),
+        "keywords": sorted(set(keywords)) if keywords else keywords,
+        "memory_type": _INTERNED.get(memory_type, memory_type),
         "text": text or "",  # KEEP full text - needed for NL2SQL context
         "text_len": len(text or "") if isinstance(text, str) else None,
     }
 
-    # If over limit, truncate text progressively
+    # Fast path: text bytes are at most 4x its character count, and the
+    # remaining fields (short names/keywords) stay well under 2 KB, so a
+    # text this small can't breach the limit - skip the JSON sizing that
+    # dominates the typical, small-chunk put
+    if (len(text or "") << 2) + 2048 <= _METADATA_SOFT_LIMIT:
+        return meta
+
+    # If over limit, cut the text to fit. Only "text" varies, so size the
+    # fixed fields once and spend the remaining byte budget on the text
+    # instead of re-serializing the whole dict per candidate cut. The
+    # budget is measured in *serialized* bytes: JSON escaping makes every
+    # newline/quote/backslash two bytes and control chars up to six, so
+    # raw UTF-8 length undercounts and can leave the dump over the limit.
     if _json_len_bytes(meta) > _METADATA_SOFT_LIMIT:
-        text_len = len(text or "")
-        # Progressively reduce text
-        for cut in [text_len * 3 // 4, text_len // 2, text_len // 4, 1000, 500, 0]:
-            meta["text"] = (text or "")[:cut]
-            if _json_len_bytes(meta) <= _METADATA_SOFT_LIMIT:
-                break
+        base_bytes = _json_len_bytes({k: v for k, v in meta.items() if k != "text"})
+        # 16 bytes headroom covers the "text" key, quotes and separators
+        budget = max(_METADATA_SOFT_LIMIT - base_bytes - 16, 0)
+        raw = text or ""
+        escaped_len = len(_dumps(raw)) - 2  # strip the surrounding quotes
+        if escaped_len > budget:
+            # Scale the cut by the measured average escape overhead, then
+            # verify once: every dropped char frees at least one escaped
+            # byte, so trimming by the overshoot guarantees fit
+            cut = raw[:int(len(raw) * budget / escaped_len)]
+            overshoot = (len(_dumps(cut)) - 2) - budget
+            if overshoot > 0:
+                cut = cut[:-overshoot] if overshoot < len(cut) else ""
+            meta["text"] = cut
 
     return meta
 
 
+def _parse_accessed_at(accessed_at) -> Optional[datetime]:
+    """Parse an accessed_at timestamp, or None when absent or malformed.
+
+    This store's writes don't set accessed_at and no consumer reads the
+    item timestamps, so the common case is the None short-circuit - a
+    datetime.now() per hit (35+ per agent turn) bought nothing.
+    """
+    if accessed_at is None:
+        return None
+    try:
+        if isinstance(accessed_at, (int, float)):
+            return datetime.fromtimestamp(accessed_at)
+        return datetime.fromisoformat(accessed_at)
+    except (TypeError, ValueError):
+        return None
+
+
+@functools.lru_cache(maxsize=1024)
 def _ns_to_str(namespace: Tuple[str, ...]) -> str:
-    """Convert namespace tuple to string representation"""
+    """Convert namespace tuple to string representation.
+
+    Every op calls this with one of a handful of tuples; the cache turns
+    the repeated join into a dict hit.
+    """
     return "/".join(namespace)
 
 
+def _vector_id(ns: str, key: str) -> str:
+    """Vector id format shared by the put, get and bulk-put paths"""
+    return f"{ns}:{key}"
+
+
 def _redact_key(k: str, keep: int = 6) -> str:
     """Redact key for logging, keeping only last N characters"""
     if not k:
@@ -96,7 +253,46 @@ class PineconeStore(BaseStore):
             raise ValueError("PINECONE_API_KEY environment variable not set")
 
         self.pc = Pinecone(api_key=api_key)
-        self.index = self.pc.Index(index_name)
+        # pool_threads sizes the urllib3 connection pool the SDK reuses
+        # across requests, so concurrent middleware searches share warm
+        # keepalive connections instead of paying TLS setup per call.
+        # 32 leaves headroom over abatch's 8 concurrent ops plus parallel
+        # agent turns; idle slots cost nothing.
+        self.index = self.pc.Index(index_name, pool_threads=32)
+
+        # Warm the pool: one cheap metadata call opens the TCP/TLS
+        # connection now rather than on the first user query
+        try:
+            stats = self.index.describe_index_stats()
+            logger.info(
+                "Index reachable.",
+                extra={
+                    "phase": "store",
+                    "event": "warmup_ok",
+                    "total_vectors": getattr(stats, 'total_vector_count', None),
+                },
+            )
+        except Exception:
+            logger.warning(
+                "Index warmup failed - first query will pay connection setup.",
+                extra={"phase": "store", "event": "warmup_failed"},
+            )
+
+        # Query-embedding LRU: before_agent and repeated test sweeps ask
+        # the same questions; each embed is an OpenAI round-trip (~100ms)
+        # that this cache turns into a dict hit. Keyed per instance, so a
+        # different embedding model never serves stale vectors.
+        self._embed_query = functools.lru_cache(maxsize=1024)(
+            self._embed_query_uncached)
+
+        # Paraphrase-level result cache for search_pair; bound to this
+        # instance (one embedding model), so model changes can't surface
+        # stale hits
+        self._pair_cache = _PairSearchCache()
+
+        # Monotonic write version, bumped on every upsert/delete; callers
+        # caching derived results key on it so writes invalidate them
+        self.version = 0
 
         logger.info(
             "PineconeStore initialized.",
@@ -111,17 +307,23 @@ class PineconeStore(BaseStore):
     # ----------------------------------------------------------------------
     # Internal Operations
     # ----------------------------------------------------------------------
+    def _embed_query_uncached(self, query: str) -> tuple:
+        """Embed a (stripped) query; tuple result keeps lru_cache entries
+        safe from caller mutation."""
+        return tuple(self.embed.embed_query(query))
+
     def _do_put(self, op: PutOp) -> None:
         """Execute a single put operation."""
         ns = _ns_to_str(op.namespace)
         t0 = time.monotonic()
-        vector_id = f"{ns}:{op.key}"
+        vector_id = _vector_id(ns, op.key)
 
         try:
             # Delete operation (value is None)
             if op.value is None:
                 self.index.delete(ids=[vector_id])
-                logger.info(
+                self.version += 1
+                logger.debug(
                     "Delete completed.",
                     extra={
                         "phase": "store",
@@ -139,7 +341,7 @@ class PineconeStore(BaseStore):
             elif "content" in op.value:
                 text = op.value["content"]
             else:
-                text = json.dumps(op.value, ensure_ascii=False)
+                text = _dumps(op.value).decode("utf-8")
 
             logger.debug(
                 "Embedding text for storage.",
@@ -151,8 +353,9 @@ class PineconeStore(BaseStore):
                 }
             )
 
-            # Compute vector embedding
-            vec = self.embed.embed_query(text) if self.embed else [0.0] * 1536
+            # Compute vector embedding through the same LRU the search
+            # path uses: re-ingesting unchanged chunks costs no API call
+            vec = list(self._embed_query(text)) if self.embed else [0.0] * 1536
 
             # Build compact metadata
             metadata = _compact_metadata(op.value, text=text)
@@ -164,8 +367,9 @@ class PineconeStore(BaseStore):
                 'values': vec,
                 'metadata': metadata
             }])
+            self.version += 1
 
-            logger.info(
+            logger.debug(
                 "Put completed.",
                 extra={
                     "phase": "store",
@@ -191,18 +395,65 @@ class PineconeStore(BaseStore):
             )
             raise
 
+    @staticmethod
+    def _put_text(value: dict) -> str:
+        """Pick the text to embed for a put, mirroring _do_put's choice."""
+        if "text" in value:
+            return value["text"]
+        if "content" in value:
+            return value["content"]
+        return _dumps(value).decode("utf-8")
+
+    def _bulk_put(self, put_ops: List[PutOp]) -> None:
+        """Upsert many puts with one embedding RPC and chunked upserts.
+
+        _do_put costs two HTTP round-trips per vector (embed + upsert);
+        for a schema load of N chunks that's 2N calls. embed_documents
+        accepts all texts in one request and Pinecone takes up to 100
+        vectors per upsert, so the same load is 1 + ceil(N/100) calls.
+        """
+        t0 = time.monotonic()
+        texts = [self._put_text(op.value) for op in put_ops]
+        embeddings = self.embed.embed_documents(texts)
+
+        vectors = []
+        for op, text, vec in zip(put_ops, texts, embeddings):
+            ns = _ns_to_str(op.namespace)
+            metadata = _compact_metadata(op.value, text=text)
+            metadata["namespace"] = ns
+            vectors.append({
+                'id': _vector_id(ns, op.key),
+                'values': vec,
+                'metadata': metadata,
+            })
+
+        for start in range(0, len(vectors), 100):
+            self.index.upsert(vectors=vectors[start:start + 100])
+        self.version += 1
+
+        logger.info(
+            "Bulk put completed.",
+            extra={
+                "phase": "store",
+                "event": "bulk_put_ok",
+                "vectors": len(vectors),
+                "upsert_calls": (len(vectors) + 99) // 100,
+                "duration_ms": int((time.monotonic() - t0) * 1000),
+            },
+        )
+
     def _do_get(self, op: GetOp) -> Optional[Item]:
         """Execute a single get operation."""
         ns = _ns_to_str(op.namespace)
         t0 = time.monotonic()
-        vector_id = f"{ns}:{op.key}"
+        vector_id = _vector_id(ns, op.key)
 
         try:
             result = self.index.fetch(ids=[vector_id])
             vectors = result.get('vectors', {})
 
             if vector_id not in vectors:
-                logger.info(
+                logger.debug(
                     "Get completed - not found.",
                     extra={
                         "phase": "store",
@@ -216,15 +467,7 @@ class PineconeStore(BaseStore):
                 return None
 
             metadata = vectors[vector_id].get('metadata', {})
-            accessed_at = metadata.get("accessed_at")
-
-            # Parse timestamp
-            if isinstance(accessed_at, (int, float)):
-                created_at = datetime.fromtimestamp(accessed_at)
-            elif isinstance(accessed_at, str):
-                created_at = datetime.fromisoformat(accessed_at)
-            else:
-                created_at = datetime.now()
+            created_at = _parse_accessed_at(metadata.get("accessed_at"))
 
             item = Item(
                 value=metadata,
@@ -234,7 +477,7 @@ class PineconeStore(BaseStore):
                 updated_at=created_at,
             )
 
-            logger.info(
+            logger.debug(
                 "Get completed.",
                 extra={
                     "phase": "store",
@@ -281,57 +524,35 @@ class PineconeStore(BaseStore):
             return []
 
         try:
-            qvec = self.embed.embed_query(op.query)
-
-            # Fetch more results to account for namespace filtering and offset
-            fetch_limit = (op.limit + op.offset) * 3
-
-            # Query Pinecone
+            qvec = list(self._embed_query(op.query.strip()))
+
+            if logger.isEnabledFor(logging.DEBUG):
+                info = self._embed_query.cache_info()
+                logger.debug(
+                    "Embed cache: %d hits / %d misses", info.hits, info.misses)
+
+            # Filter server-side: _do_put writes metadata["namespace"],
+            # so Pinecone can scope the search before transfer and we
+            # request exactly the rows we need instead of over-fetching
+            # 3x (each hit carries multi-KB text metadata) and dropping
+            # other namespaces in Python
+            prefix_str = f"{ns}:"
             response = self.index.query(
                 vector=qvec,
-                top_k=min(fetch_limit, 10000),  # Pinecone max
-                include_metadata=True
+                top_k=op.limit + op.offset,
+                include_metadata=True,
+                filter={"namespace": {"$eq": ns}},
             )
 
             matches = response.get('matches', [])
 
-            # Filter by namespace prefix
-            namespace_prefix_str = f"{ns}:"
-            filtered_results = []
-
-            for match in matches:
-                vector_id = match.get('id', '')
-                if vector_id.startswith(namespace_prefix_str):
-                    # Extract actual key without namespace prefix
-                    actual_key = vector_id[len(namespace_prefix_str):]
-                    metadata = match.get('metadata', {})
-                    accessed_at = metadata.get("accessed_at")
-
-                    # Parse timestamp
-                    if isinstance(accessed_at, (int, float)):
-                        created_at = datetime.fromtimestamp(accessed_at)
-                    elif isinstance(accessed_at, str):
-                        created_at = datetime.fromisoformat(accessed_at)
-                    else:
-                        created_at = datetime.now()
-
-                    item = SearchItem(
-                        namespace=op.namespace_prefix,
-                        key=actual_key,
-                        value=metadata,
-                        created_at=created_at,
-                        updated_at=created_at,
-                        score=match.get('score'),  # Pinecone score (0-1, higher is better)
-                    )
-                    filtered_results.append(item)
+            match_to_item = self._match_to_item  # resolve once, not per match
+            final_results = [
+                match_to_item(match, op.namespace_prefix, prefix_str)
+                for match in matches[op.offset:]
+            ]
 
-                    if len(filtered_results) >= op.limit + op.offset:
-                        break
-
-            # Apply offset
-            final_results = filtered_results[op.offset:op.offset + op.limit]
-
-            logger.info(
+            logger.debug(
                 "Search completed.",
                 extra={
                     "phase": "store",
@@ -340,7 +561,6 @@ class PineconeStore(BaseStore):
                     "limit": op.limit,
                     "offset": op.offset,
                     "fetched": len(matches),
-                    "filtered": len(filtered_results),
                     "returned": len(final_results),
                     "query_len": len(op.query),
                     "vector_dim": len(qvec),
@@ -364,6 +584,118 @@ class PineconeStore(BaseStore):
             )
             return []
 
+    def _match_to_item(self, match: dict, namespace: Tuple[str, ...],
+                       prefix_str: str) -> SearchItem:
+        """Convert a raw Pinecone match into a SearchItem."""
+        # Queries run with include_metadata=True, so 'id' and 'metadata'
+        # are always present - direct indexing over .get with defaults
+        metadata = match['metadata']
+        created_at = _parse_accessed_at(metadata.get("accessed_at"))
+
+        return SearchItem(
+            namespace=namespace,
+            key=match['id'][len(prefix_str):],
+            value=metadata,
+            created_at=created_at,
+            updated_at=created_at,
+            score=match.get('score'),
+        )
+
+    def search_pair(
+        self,
+        query: str,
+        semantic_limit: int = 25,
+        procedural_limit: int = 10,
+        score_threshold: Optional[float] = None,
+    ) -> Tuple[List[SearchItem], List[SearchItem]]:
+        """Search the semantic and procedural namespaces in one request.
+
+        Issuing separate searches per namespace is an N+1 against
+        Pinecone: two embeds and two HTTP round-trips for one user
+        question. Both namespaces live in the same index and are told
+        apart client-side by their id prefix, so one embed plus one
+        over-fetched query can serve both partitions.
+
+        When `score_threshold` is given, the partition loop stops at the
+        first match below it - matches arrive sorted by score, so the
+        discarded tail is never converted to SearchItems at all.
+        """
+        t0 = time.monotonic()
+
+        if not query or not self.embed:
+            return [], []
+
+        try:
+            qvec = list(self._embed_query(query.strip()))
+
+            cached = self._pair_cache.get(qvec, self.version)
+            if cached is not None:
+                logger.debug(
+                    "Pair search served from similarity cache.",
+                    extra={"phase": "store", "event": "search_pair_cached"},
+                )
+                return cached
+
+            # Scope to the two wanted namespaces server-side; a modest
+            # over-fetch still covers skew between the partitions, since
+            # matches come back interleaved in score order
+            fetch_limit = (semantic_limit + procedural_limit) * 2
+            response = self.index.query(
+                vector=qvec,
+                top_k=min(fetch_limit, 10000),
+                include_metadata=True,
+                filter={"namespace": {"$in": ["semantic", "procedural"]}},
+            )
+
+            semantic: List[SearchItem] = []
+            procedural: List[SearchItem] = []
+            # Hoist attribute/method lookups out of the partition loop;
+            # 'id' is always present on Pinecone matches, so index it
+            # directly rather than .get with a default
+            match_to_item = self._match_to_item
+            for match in response.get('matches', []):
+                if (score_threshold is not None
+                        and match.get('score', 0) < score_threshold):
+                    # Sorted descending: everything after is lower still
+                    break
+                vector_id = match['id']
+                if vector_id.startswith('semantic:'):
+                    if len(semantic) < semantic_limit:
+                        semantic.append(match_to_item(
+                            match, ("semantic",), 'semantic:'))
+                elif vector_id.startswith('procedural:'):
+                    if len(procedural) < procedural_limit:
+                        procedural.append(match_to_item(
+                            match, ("procedural",), 'procedural:'))
+                if (len(semantic) >= semantic_limit
+                        and len(procedural) >= procedural_limit):
+                    break
+
+            logger.debug(
+                "Pair search completed.",
+                extra={
+                    "phase": "store",
+                    "event": "search_pair_ok",
+                    "semantic": len(semantic),
+                    "procedural": len(procedural),
+                    "duration_ms": int((time.monotonic() - t0) * 1000),
+                },
+            )
+            self._pair_cache.put(qvec, (semantic, procedural), self.version)
+            return semantic, procedural
+
+        except Exception as e:
+            logger.error(
+                f"Pair search failed. {traceback.format_exc()}",
+                extra={
+                    "phase": "store",
+                    "event": "search_pair_error",
+                    "exception_type": type(e).__name__,
+                    "duration_ms": int((time.monotonic() - t0) * 1000),
+                },
+            )
+            return [], []
+
     def _do_list_namespaces(self, op: ListNamespacesOp) -> List[Tuple[str, ...]]:
         """Execute a list namespaces operation."""
         t0 = time.monotonic()
@@ -398,35 +730,64 @@ class PineconeStore(BaseStore):
     # ----------------------------------------------------------------------
     # BaseStore Interface Implementation
     # ----------------------------------------------------------------------
+    def _dispatch_op(self, op: Op) -> Result:
+        """Route a single op to its handler; shared by batch and abatch."""
+        if isinstance(op, PutOp):
+            self._do_put(op)
+            return None
+        if isinstance(op, GetOp):
+            return self._do_get(op)
+        if isinstance(op, SearchOp):
+            return self._do_search(op)
+        if isinstance(op, ListNamespacesOp):
+            return self._do_list_namespaces(op)
+        logger.warning(
+            "Unknown batch op.",
+            extra={"phase": "store", "event": "batch_unknown_op", "op": type(op).__name__},
+        )
+        return None
+
     def batch(self, ops: Iterable[Op]) -> list[Result]:
         """Execute multiple operations synchronously in a single batch."""
         t0 = time.monotonic()
         ops_list = list(ops)
 
-        logger.info(
+        logger.debug(
             "Batch started.",
             extra={"phase": "store", "event": "batch_start", "ops_count": len(ops_list)},
         )
 
+        # Coalesce the puts (deletes excluded): one embedding call for all
+        # texts, then <=100-vector upserts, instead of 2 HTTP round-trips
+        # per op. Put results are always None, so ordering is unaffected.
+        # On bulk failure the per-op loop below retries them individually.
+        put_ops = [op for op in ops_list
+                   if isinstance(op, PutOp) and op.value is not None]
+        bulk_done = False
+        if len(put_ops) > 1 and self.embed:
+            try:
+                self._bulk_put(put_ops)
+                bulk_done = True
+            except Exception as e:
+                logger.error(
+                    f"Bulk put failed - falling back to per-op puts. {traceback.format_exc()}",
+                    extra={
+                        "phase": "store",
+                        "event": "bulk_put_error",
+                        "ops_count": len(put_ops),
+                        "exception_type": type(e).__name__,
+                    },
+                )
+
         results: list[Result] = []
 
         for op in ops_list:
             try:
-                if isinstance(op, PutOp):
-                    self._do_put(op)
+                if (isinstance(op, PutOp) and bulk_done
+                        and op.value is not None):
                     results.append(None)
-                elif isinstance(op, GetOp):
-                    results.append(self._do_get(op))
-                elif isinstance(op, SearchOp):
-                    results.append(self._do_search(op))
-                elif isinstance(op, ListNamespacesOp):
-                    results.append(self._do_list_namespaces(op))
                 else:
-                    logger.warning(
-                        "Unknown batch op.",
-                        extra={"phase": "store", "event": "batch_unknown_op", "op": type(op).__name__},
-                    )
-                    results.append(None)
+                    results.append(self._dispatch_op(op))
             except Exception as e:
                 logger.error(
                     f"Batch op failed. {traceback.format_exc()}",
@@ -439,7 +800,7 @@ class PineconeStore(BaseStore):
                 )
                 results.append(None)
 
-        logger.info(
+        logger.debug(
             "Batch completed.",
             extra={
                 "phase": "store",
@@ -452,37 +813,51 @@ class PineconeStore(BaseStore):
         return results
 
     async def abatch(self, ops: Iterable[Op]) -> list[Result]:
-        """Execute multiple operations asynchronously in a single batch."""
+        """Execute multiple operations asynchronously in a single batch.
+
+        Each op is independent network I/O, so the ops run concurrently
+        on worker threads instead of serializing through one offloaded
+        batch() call: wall time becomes the slowest op rather than the
+        sum. The semaphore caps in-flight ops to stay inside the HTTP
+        pool and provider rate limits. A failed op logs and yields None,
+        matching batch()'s per-op error handling.
+        """
         import asyncio
         t0 = time.monotonic()
         ops_list = list(ops)
 
-        logger.info(
+        logger.debug(
             "Async batch dispatch.",
             extra={"phase": "store", "event": "abatch_start", "ops_count": len(ops_list)},
         )
 
-        try:
-            out = await asyncio.to_thread(self.batch, ops_list)
-            logger.info(
-                "Async batch completed.",
-                extra={
-                    "phase": "store",
-                    "event": "abatch_done",
-                    "ops_count": len(ops_list),
-                    "duration_ms": int((time.monotonic() - t0) * 1000),
-                },
-            )
-            return out
-        except Exception as e:
-            logger.error(
-                f"Async batch failed. {traceback.format_exc()}",
-                extra={
-                    "phase": "store",
-                    "event": "abatch_error",
-                    "ops_count": len(ops_list),
-                    "exception_type": type(e).__name__,
-                    "duration_ms": int((time.monotonic() - t0) * 1000),
-                },
-            )
-            raise
\ No newline at end of file
+        semaphore = asyncio.Semaphore(8)
+
+        async def run(op: Op) -> Result:
+            async with semaphore:
+                try:
+                    return await asyncio.to_thread(self._dispatch_op, op)
+                except Exception as e:
+                    logger.error(
+                        f"Async batch op failed. {traceback.format_exc()}",
+                        extra={
+                            "phase": "store",
+                            "event": "abatch_op_error",
+                            "op": type(op).__name__,
+                            "exception_type": type(e).__name__,
+                        },
+                    )
+                    return None
+
+        results = list(await asyncio.gather(*(run(op) for op in ops_list)))
+
+        logger.debug(
+            "Async batch completed.",
+            extra={
+                "phase": "store",
+                "event": "abatch_done",
+                "ops_count": len(ops_list),
+                "duration_ms": int((time.monotonic() - t0) * 1000),
+            },
+        )
+        return results
\ No newline at end of file